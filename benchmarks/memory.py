@@ -0,0 +1,141 @@
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from Scanner import Scanner
+from Parser import Parser
+from Interpreter import Interpreter
+from Resolver import Resolver
+from Environment import Environment
+from LoxClass import LoxClass
+from LoxInstance import LoxInstance
+from InlineCache import InlineCache
+from Expr import Expr
+from Stmt import Stmt
+
+# Reports the memory cost of the front end's data structures on a large
+# generated script: bytes per token (as Token objects and as CompactTokens),
+# per AST node, per environment and per instance.
+#
+#     python benchmarks/memory.py [size in MB]
+
+TEMPLATE = """
+class Shape{i} {{
+    init(width, height) {{
+        this.width = width;
+        this.height = height;
+    }}
+
+    area() {{
+        return this.width * this.height + {i};
+    }}
+}}
+
+fun work{i}(n) {{
+    var total = 0;
+    for (var k = 0; k < n; k = k + 1) {{
+        if (k % 3 == 0 and k != {i}) {{
+            total = total + Shape{i}(k, 2).area();
+        }} else {{
+            total = total - (k / 2);
+        }}
+    }}
+    print "work{i}: " + "done";
+    return total;
+}}
+"""
+
+
+def generate(size: int) -> str:
+    chunks = []
+    length = 0
+    i = 0
+    while length < size:
+        chunk = TEMPLATE.format(i=i)
+        chunks.append(chunk)
+        length += len(chunk)
+        i += 1
+    return ''.join(chunks)
+
+
+def children(node):
+    names = []
+    for klass in type(node).__mro__:
+        names.extend(getattr(klass, '__slots__', ()))
+    if hasattr(node, '__dict__'):
+        names.extend(vars(node))
+
+    for name in names:
+        value = getattr(node, name, None)
+        if isinstance(value, list):
+            yield from value
+        else:
+            yield value
+
+
+def countNodes(statements) -> int:
+    count = 0
+    pending = list(statements)
+    while pending:
+        node = pending.pop()
+        if isinstance(node, (Expr, Stmt)):
+            count += 1
+            pending.extend(children(node))
+    return count
+
+
+def measure(function):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = function()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def main():
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 2
+    source = generate(int(megabytes * 1024 * 1024))
+
+    tokens, tokenBytes = measure(lambda: Scanner(source).scan())
+    compact, compactBytes = measure(lambda: Scanner(source).scanCompact())
+    statements, nodeBytes = measure(lambda: Parser(tokens).parse())
+    nodes = countNodes(statements)
+
+    interpreter = Interpreter(statements)
+    Resolver(interpreter).resolve()
+
+    # Environments as the interpreter builds them for a call and the block
+    # nested in it: two parameter slots and two locals.
+    count = 100000
+    environments, environmentBytes = measure(
+        lambda: [Environment(Environment(interpreter.globals, [1.0, 2.0]), [3.0, 4.0]) for _ in range(count)])
+
+    klass = LoxClass('Point', None, {})
+
+    # Fields are set through inline caches, as a SetExpr sets them.
+    width = InlineCache('width')
+    height = InlineCache('height')
+
+    def instances():
+        result = []
+        for _ in range(count):
+            instance = LoxInstance(klass)
+            instance.setCached(width, 1.0)
+            instance.setCached(height, 2.0)
+            result.append(instance)
+        return result
+    _, instanceBytes = measure(instances)
+
+    print(f"source       {len(source) / 1024 / 1024:10.2f} MB")
+    print(f"tokens       {len(tokens):10} {tokenBytes / len(tokens):8.1f} bytes/token")
+    print(f"compact      {len(compact):10} {compactBytes / len(compact):8.1f} bytes/token")
+    print(f"AST nodes    {nodes:10} {nodeBytes / nodes:8.1f} bytes/node")
+    print(f"environments {2 * count:10} {environmentBytes / (2 * count):8.1f} bytes/environment")
+    print(f"instances    {count:10} {instanceBytes / count:8.1f} bytes/instance")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+import gc
+import io
+import os
+import sys
+import json
+import math
+import time
+import statistics
+import contextlib
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'src'))
+
+from Lox import Lox, BACKENDS
+
+# Runs the Lox programs in benchmarks/lox a number of times in this process,
+# each time through the whole pipeline from scanning to executing, and
+# reports the median and 95th percentile time and runs per second. Each run
+# is paired with a run of calibration(), and the median ratio of the two
+# times is what gets compared with the baseline, so the machine getting
+# faster or slower cancels out; the exit status is 1 when any benchmark got
+# slower by more than the threshold. Baselines only compare well on the
+# machine they were recorded on, so none is kept in the repository: record
+# one first with --save.
+#
+#     python benchmarks/run.py [--backend=tree|closure|vm|python|all] [--runs=N]
+#                              [--threshold=fraction] [--baseline=path] [--save] [name ...]
+
+PROGRAMS = os.path.join(HERE, 'lox')
+BASELINE = os.path.join(HERE, 'baseline.json')
+
+
+def usage():
+    print(f"Wrong usage, correct usage: run.py [--backend={'|'.join(BACKENDS)}|all] [--runs=N] [--threshold=fraction] [--baseline=path] [--save] [name ...]")
+    sys.exit(1)
+
+
+def percentile(times: list, fraction: float) -> float:
+    ordered = sorted(times)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class Node:
+    __slots__ = ('value', 'next')
+
+    def __init__(self, value, next):
+        self.value = value
+        self.next = next
+
+
+def calibration() -> None:
+    # Plain Python doing what the interpreters do most: calls, attribute
+    # reads and small allocations. It takes the same time on a given
+    # machine whatever the interpreter's code looks like.
+    node = None
+    for i in range(20000):
+        node = Node(i * 0.5, node)
+    while node != None:
+        node = node.next
+
+
+def measure(backend: str, source: str, output) -> tuple[float, float]:
+    # Garbage left by the last run is collected before this one starts. The
+    # run is paired with a run of calibration(), so the machine getting
+    # faster or slower in the meantime shows in both. The python backend
+    # keeps compiled programs for the life of the process, which would let
+    # it skip scanning, parsing and translating after the first run.
+    if backend == 'python':
+        from Transpiler import Transpiler
+        Transpiler.cache.clear()
+    lox = Lox(backend)
+    gc.collect()
+    start = time.perf_counter()
+    calibration()
+    calibrated = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        lox.run(source)
+    return time.perf_counter() - calibrated, calibrated - start
+
+
+def summarize(measurements: list) -> dict:
+    times = [elapsed for elapsed, _ in measurements]
+    relative = statistics.median(elapsed / calibration for elapsed, calibration in measurements)
+    return {'relative': relative, 'median': statistics.median(times), 'p95': percentile(times, 0.95)}
+
+
+def compare(result: dict, baseline: dict, threshold: float) -> tuple[str, bool]:
+    if baseline == None or 'relative' not in baseline:
+        return "new", False
+    change = result['relative'] / baseline['relative'] - 1
+    regressed = change > threshold
+    return f"{change * 100:+6.1f}%{' REGRESSED' if regressed else ''}", regressed
+
+
+def main():
+    backends = ['tree']
+    runs = 20
+    threshold = 0.25
+    path = BASELINE
+    save = False
+    names = []
+    for arg in sys.argv[1:]:
+        if arg.startswith('--backend='):
+            value = arg[len('--backend='):]
+            backends = list(BACKENDS) if value == 'all' else [value]
+            if any(backend not in BACKENDS for backend in backends):
+                usage()
+        elif arg.startswith('--runs='):
+            runs = int(arg[len('--runs='):])
+        elif arg.startswith('--threshold='):
+            threshold = float(arg[len('--threshold='):])
+        elif arg.startswith('--baseline='):
+            path = arg[len('--baseline='):]
+        elif arg == '--save':
+            save = True
+        elif arg.startswith('--'):
+            usage()
+        else:
+            names.append(arg)
+
+    available = sorted(name[:-len('.lox')] for name in os.listdir(PROGRAMS) if name.endswith('.lox'))
+    if any(name not in available for name in names):
+        usage()
+    names = names or available
+
+    baselines = {}
+    if os.path.exists(path):
+        with open(path) as file:
+            baselines = json.load(file)
+    elif not save:
+        print(f"No baseline at {path}, record one on this machine first with --save.")
+        sys.exit(1)
+
+    sources = {}
+    for name in names:
+        with open(os.path.join(PROGRAMS, name + '.lox')) as file:
+            sources[name] = file.read()
+    benchmarks = [(backend, name) for backend in backends for name in names]
+
+    # The benchmarks take turns, one run each per round, so a stretch of
+    # the machine being busy touches a run or two of every benchmark rather
+    # than all runs of one. The first round only warms up, so the results
+    # don't include importing the backends.
+    measurements = {benchmark: [] for benchmark in benchmarks}
+    output = io.StringIO()
+    for round in range(runs + 1):
+        for backend, name in benchmarks:
+            measurement = measure(backend, sources[name], output)
+            if round > 0:
+                measurements[backend, name].append(measurement)
+
+    regressions = 0
+    print(f"{'benchmark':<24} {'median':>10} {'p95':>10} {'runs/s':>10} {'relative':>10}  baseline")
+    for backend, name in benchmarks:
+        results = baselines.setdefault(backend, {})
+        result = summarize(measurements[backend, name])
+        status, regressed = compare(result, results.get(name), threshold)
+        regressions += regressed
+        print(f"{backend + '/' + name:<24} {result['median'] * 1000:8.2f}ms {result['p95'] * 1000:8.2f}ms "
+              f"{1 / result['median']:10.1f} {result['relative']:10.2f}  {status}")
+        if save:
+            results[name] = result
+
+    if save:
+        with open(path, 'w') as file:
+            json.dump(baselines, file, indent=4, sort_keys=True)
+            file.write('\n')
+        print(f"baseline saved to {path}")
+    elif regressions:
+        print(f"{regressions} benchmark(s) slower than the baseline by more than {threshold * 100:.0f}%")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from Scanner import Scanner
+from memory import generate
+
+# Reports scanner throughput on a large generated script, best of a few runs.
+#
+#     python benchmarks/scan.py [size in MB] [runs]
+
+
+def main():
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    source = generate(int(megabytes * 1024 * 1024))
+    size = len(source) / 1024 / 1024
+
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        tokens = Scanner(source).scan()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best == None else min(best, elapsed)
+
+    print(f"source  {size:10.2f} MB")
+    print(f"tokens  {len(tokens):10}")
+    print(f"scan    {best:10.3f} s {size / best:8.2f} MB/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+import os
+import sys
+import time
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+LOX = os.path.join(ROOT, 'src', 'Lox.py')
+SCRIPT = os.path.join(ROOT, 'samples', 'test.lox')
+
+# What starting up may cost on top of starting a bare Python process, with or
+# without the cache. Measured at 25 to 40 ms per backend, with the
+# interpreter's own modules already compiled to bytecode.
+BUDGET = 0.050
+
+# Reports the cold-start cost of running a short script with each backend,
+# with and without the program cache, against a bare Python process. Each
+# figure is the median wall time of a number of fresh processes. The exit
+# status is 1 when any of them costs more than the budget over Python.
+#
+#     python benchmarks/startup.py [--budget=ms] [runs]
+
+
+def measure(command: list, runs: int) -> float:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def usage():
+    print("Wrong usage, correct usage: startup.py [--budget=ms] [runs]")
+    sys.exit(1)
+
+
+def main():
+    runs = 20
+    budget = BUDGET
+    for arg in sys.argv[1:]:
+        if arg.startswith('--budget='):
+            budget = float(arg[len('--budget='):]) / 1000
+        elif arg.isdigit():
+            runs = int(arg)
+        else:
+            usage()
+
+    python = measure([sys.executable, '-c', 'pass'], runs)
+    print(f"{'python':<16} {python * 1000:8.1f} ms")
+
+    over = []
+    with tempfile.TemporaryDirectory() as directory:
+        for backend in ('tree', 'closure', 'vm', 'python'):
+            command = [sys.executable, LOX, f'--backend={backend}']
+            cold = measure(command + ['--no-cache', SCRIPT], runs)
+            cached = measure(command + [f'--cache-dir={directory}', SCRIPT], runs)
+            print(f"{backend:<16} {cold * 1000:8.1f} ms {cached * 1000:8.1f} ms cached"
+                  f" {(cold - python) * 1000:8.1f} ms {(cached - python) * 1000:8.1f} ms cached over python")
+            if cold - python > budget:
+                over.append(backend)
+            if cached - python > budget:
+                over.append(f"{backend} cached")
+
+    if over:
+        print(f"Over the {budget * 1000:.0f} ms budget: {', '.join(over)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
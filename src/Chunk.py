@@ -0,0 +1,74 @@
+OP_CONSTANT       = 0
+OP_NIL            = 1
+OP_TRUE           = 2
+OP_FALSE          = 3
+OP_POP            = 4
+OP_POPN           = 5
+OP_GET_LOCAL      = 6
+OP_SET_LOCAL      = 7
+OP_GET_GLOBAL     = 8
+OP_DEFINE_GLOBAL  = 9
+OP_SET_GLOBAL     = 10
+OP_GET_UPVALUE    = 11
+OP_SET_UPVALUE    = 12
+OP_GET_PROPERTY   = 13
+OP_SET_PROPERTY   = 14
+OP_GET_SUPER      = 15
+OP_EQUAL          = 16
+OP_NOT_EQUAL      = 17
+OP_GREATER        = 18
+OP_GREATER_EQUAL  = 19
+OP_LESS           = 20
+OP_LESS_EQUAL     = 21
+OP_ADD            = 22
+OP_SUBTRACT       = 23
+OP_MULTIPLY       = 24
+OP_DIVIDE         = 25
+OP_MODULO         = 26
+OP_NOT            = 27
+OP_NEGATE         = 28
+OP_PRINT          = 29
+OP_JUMP           = 30
+OP_JUMP_IF_FALSE  = 31
+OP_LOOP           = 32
+OP_CALL           = 33
+OP_INVOKE         = 34
+OP_CLOSURE        = 35
+OP_CLOSE_UPVALUE  = 36
+OP_RETURN         = 37
+OP_CLASS          = 38
+OP_INHERIT        = 39
+OP_METHOD         = 40
+
+
+class FunctionProto:
+    def __init__(self, name: str, arity: int = 0):
+        self.name: str = name
+        self.arity: int = arity
+        self.code: list[int] = []
+        self.constants: list = []
+        self.constantIndex: dict = {}
+        self.upvalues: list[tuple[bool, int]] = []
+
+
+    def emit(self, op: int, arg: int = 0) -> int:
+        # Every instruction is an (opcode, operand) pair, so the VM can always
+        # fetch two slots and jumps can be patched in place.
+        self.code.append(op)
+        self.code.append(arg)
+        return len(self.code) - 2
+
+
+    def addConstant(self, value) -> int:
+        # 1.0 == True in Python, so the type is part of the key.
+        key = (type(value), value) if isinstance(value, (str, float)) else id(value)
+        index = self.constantIndex.get(key)
+        if index == None:
+            index = len(self.constants)
+            self.constants.append(value)
+            self.constantIndex[key] = index
+        return index
+
+
+    def __str__(self):
+        return f"<fn {self.name}>"
@@ -0,0 +1,50 @@
+from array import array
+from Token import *
+
+TYPES = tuple(TokenType)
+CODES = {type: code for code, type in enumerate(TYPES)}
+
+
+class CompactTokens:
+    __slots__ = ('source', 'types', 'starts', 'ends', 'lines')
+
+    # Tokens kept as parallel arrays of type codes, source offsets and line
+    # numbers. A lexeme's text is only sliced out of the source when a Token
+    # is actually asked for.
+    def __init__(self, source: str):
+        self.source = source
+        self.types = array('B')
+        self.starts = array('I')
+        self.ends = array('I')
+        self.lines = array('I')
+
+
+    def append(self, code: int, start: int, end: int, line: int) -> None:
+        self.types.append(code)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.lines.append(line)
+
+
+    def data(self, index: int):
+        type = TYPES[self.types[index]]
+        if type == TokenType.IDENTIFIER:
+            return self.source[self.starts[index]:self.ends[index]]
+        if type == TokenType.STRING:
+            return self.source[self.starts[index] + 1:self.ends[index] - 1]
+        if type == TokenType.NUMBER:
+            return float(self.source[self.starts[index]:self.ends[index]])
+        return None
+
+
+    def token(self, index: int) -> Token:
+        return Token(TYPES[self.types[index]], self.data(index), self.lines[index])
+
+
+    def __len__(self):
+        return len(self.types)
+
+
+    def __iter__(self):
+        for index in range(len(self.types)):
+            yield self.token(index)
@@ -0,0 +1,194 @@
+from Chunk import *
+
+class FunctionState:
+    def __init__(self, enclosing, proto: FunctionProto, kind: str):
+        self.enclosing = enclosing
+        self.proto = proto
+        self.kind = kind
+        # Slot 0 holds the callee, or the receiver for methods.
+        self.locals: list[list] = [['this' if kind in ('method', 'initializer') else '', 0, False]]
+        self.upvalues: list[tuple[bool, int]] = proto.upvalues
+        self.scopeDepth = 0
+
+
+class Compiler:
+    def __init__(self):
+        self.state: FunctionState = None
+
+
+    def compile(self, statements) -> FunctionProto:
+        self.state = FunctionState(None, FunctionProto('script'), 'script')
+
+        for statement in statements:
+            statement.compile(self)
+
+        self.emitReturn()
+        return self.state.proto
+
+
+    def emit(self, op: int, arg: int = 0) -> int:
+        return self.state.proto.emit(op, arg)
+
+
+    def argumentCount(self, arguments: list) -> int:
+        # OP_INVOKE packs the count into the low byte of its operand. The
+        # parser only warns past 255, so the limit is enforced here, and for
+        # OP_CALL too so both kinds of call take the same programs.
+        if len(arguments) > 255:
+            print("Can't have more than 255 arguments.")
+            exit(1)
+        return len(arguments)
+
+
+    def emitConstant(self, value) -> None:
+        self.emit(OP_CONSTANT, self.constant(value))
+
+
+    def constant(self, value) -> int:
+        return self.state.proto.addConstant(value)
+
+
+    def emitJump(self, op: int) -> int:
+        return self.emit(op, 0)
+
+
+    def patchJump(self, offset: int) -> None:
+        code = self.state.proto.code
+        code[offset + 1] = len(code) - offset - 2
+
+
+    def emitLoop(self, start: int) -> None:
+        code = self.state.proto.code
+        self.emit(OP_LOOP, len(code) + 2 - start)
+
+
+    def emitReturn(self) -> None:
+        if self.state.kind == 'initializer':
+            self.emit(OP_GET_LOCAL, 0)
+        else:
+            self.emitConstant("nil")
+        self.emit(OP_RETURN)
+
+
+    def beginScope(self) -> None:
+        self.state.scopeDepth += 1
+
+
+    def endScope(self) -> None:
+        state = self.state
+        state.scopeDepth -= 1
+
+        pending = 0
+        while state.locals and state.locals[-1][1] > state.scopeDepth:
+            if state.locals[-1][2]:
+                self.emitPops(pending)
+                pending = 0
+                self.emit(OP_CLOSE_UPVALUE)
+            else:
+                pending += 1
+            state.locals.pop()
+        self.emitPops(pending)
+
+
+    def emitPops(self, count: int) -> None:
+        if count == 1:
+            self.emit(OP_POP)
+        elif count > 1:
+            self.emit(OP_POPN, count)
+
+
+    def declareVariable(self, name: str) -> None:
+        # Locals live on the stack in declaration order, so declaring one just
+        # reserves the slot its initializer is about to be pushed into.
+        if self.state.scopeDepth > 0:
+            self.state.locals.append([name, -1, False])
+
+
+    def markInitialized(self) -> None:
+        if self.state.scopeDepth > 0:
+            self.state.locals[-1][1] = self.state.scopeDepth
+
+
+    def defineVariable(self, name: str) -> None:
+        if self.state.scopeDepth > 0:
+            self.markInitialized()
+            return
+        self.emit(OP_DEFINE_GLOBAL, self.constant(name))
+
+
+    def getVariable(self, name: str) -> None:
+        slot = self.resolveLocal(self.state, name)
+        if slot != -1:
+            self.emit(OP_GET_LOCAL, slot)
+            return
+
+        index = self.resolveUpvalue(self.state, name)
+        if index != -1:
+            self.emit(OP_GET_UPVALUE, index)
+            return
+
+        self.emit(OP_GET_GLOBAL, self.constant(name))
+
+
+    def setVariable(self, name: str) -> None:
+        slot = self.resolveLocal(self.state, name)
+        if slot != -1:
+            self.emit(OP_SET_LOCAL, slot)
+            return
+
+        index = self.resolveUpvalue(self.state, name)
+        if index != -1:
+            self.emit(OP_SET_UPVALUE, index)
+            return
+
+        self.emit(OP_SET_GLOBAL, self.constant(name))
+
+
+    def resolveLocal(self, state: FunctionState, name: str) -> int:
+        for i in range(len(state.locals) - 1, -1, -1):
+            if state.locals[i][0] == name:
+                return i
+        return -1
+
+
+    def resolveUpvalue(self, state: FunctionState, name: str) -> int:
+        if state.enclosing == None:
+            return -1
+
+        slot = self.resolveLocal(state.enclosing, name)
+        if slot != -1:
+            state.enclosing.locals[slot][2] = True
+            return self.addUpvalue(state, True, slot)
+
+        index = self.resolveUpvalue(state.enclosing, name)
+        if index != -1:
+            return self.addUpvalue(state, False, index)
+
+        return -1
+
+
+    def addUpvalue(self, state: FunctionState, isLocal: bool, index: int) -> int:
+        upvalue = (isLocal, index)
+        if upvalue in state.upvalues:
+            return state.upvalues.index(upvalue)
+        state.upvalues.append(upvalue)
+        return len(state.upvalues) - 1
+
+
+    def function(self, declaration, kind: str) -> None:
+        proto = FunctionProto(declaration.name, len(declaration.parameters))
+        self.state = FunctionState(self.state, proto, kind)
+        self.beginScope()
+
+        for parameter in declaration.parameters:
+            self.declareVariable(parameter.data)
+            self.defineVariable(parameter.data)
+
+        # The whole frame is discarded on return, so the body's locals are
+        # compiled into the parameters' scope instead of a nested block.
+        for statement in declaration.body.statements:
+            statement.compile(self)
+        self.emitReturn()
+
+        self.state = self.state.enclosing
+        self.emit(OP_CLOSURE, self.constant(proto))
@@ -0,0 +1,13 @@
+class ReturnSignal:
+    __slots__ = ()
+
+    def __repr__(self):
+        return "RETURN"
+
+
+# What a statement returns once a return statement inside it has run, in
+# place of raising an exception. The value being returned is left in
+# interpreter.returnValue, and every enclosing statement hands RETURN up to
+# the function being called. Any other result means the statement completed
+# normally.
+RETURN = ReturnSignal()
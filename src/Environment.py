@@ -1,15 +1,20 @@
 class Environment():
-    def __init__(self, enclosing = None):
-        self.values = {}
+    __slots__ = ('values', 'enclosing')
+
+    # Values are stored by slot. The resolver numbers the names of a scope in
+    # declaration order, and declarations run in that same order, so defining
+    # a variable is an append and every access is a plain index.
+    def __init__(self, enclosing = None, values = None):
+        self.values = values if values != None else []
         self.enclosing = enclosing
 
 
-    def getAt(self, dist, name): 
-        return self.ancestor(dist).values[name]
+    def getAt(self, dist, slot): 
+        return self.ancestor(dist).values[slot]
 
 
-    def assignAt(self, dist, name, value):
-        self.ancestor(dist).values[name] = value
+    def assignAt(self, dist, slot, value):
+        self.ancestor(dist).values[slot] = value
 
 
     def ancestor(self, dist):
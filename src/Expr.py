@@ -3,8 +3,14 @@ from Token import *
 from LoxCallable import LoxCallable
 from Environment import *
 from LoxInstance import LoxInstance
+from LoxFunction import LoxFunction, TailCall
+from LoxClass import LoxClass
+from InlineCache import InlineCache
+from Chunk import *
 
 class Expr(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def evaluate(self, interpreter):
         pass
@@ -15,56 +21,377 @@ class Expr(ABC):
         pass
 
 
+    @abstractmethod
+    def compile(self, compiler):
+        pass
+
+
+    @abstractmethod
+    def toClosure(self, interpreter):
+        pass
+
+
+    @abstractmethod
+    def transpile(self, transpiler):
+        pass
+
+
+    @abstractmethod
+    def optimize(self, optimizer):
+        pass
+
+
 class BinaryExpr(Expr):
+    __slots__ = ('left', 'operator', 'right')
+
+    # Abstract: every operator is a subclass with its own evaluate, built by
+    # makeBinary.
     def __init__(self, left, operator, right):
         self.left: Expr = left
         self.operator: TokenType = operator
         self.right: Expr = right
 
+
+    def resolve(self, resolver):
+        self.left.resolve(resolver)
+        self.right.resolve(resolver)
     
-    def evaluate(self, interpreter):
-        left = self.left.evaluate(interpreter)
-        right = self.right.evaluate(interpreter)
+    def compile(self, compiler):
+        self.left.compile(compiler)
+        self.right.compile(compiler)
 
         match(self.operator.type):
             case TokenType.PLUS:
-                if isinstance(left, float) and isinstance(right, float):
-                    return left + right 
-                if isinstance(left, str) and isinstance(right, str):
-                    return left + right
-                print(f"Type error, unsupported operator {self.operator.type.name} for operand types {type(left)} and {type(right)}")
-                exit(1)
+                compiler.emit(OP_ADD)
+            case TokenType.MINUS:
+                compiler.emit(OP_SUBTRACT)
+            case TokenType.STAR:
+                compiler.emit(OP_MULTIPLY)
+            case TokenType.SLASH:
+                compiler.emit(OP_DIVIDE)
+            case TokenType.MOD:
+                compiler.emit(OP_MODULO)
+            case TokenType.GREATER:
+                compiler.emit(OP_GREATER)
+            case TokenType.GREATER_EQUAL:
+                compiler.emit(OP_GREATER_EQUAL)
+            case TokenType.LESS:
+                compiler.emit(OP_LESS)
+            case TokenType.LESS_EQUAL:
+                compiler.emit(OP_LESS_EQUAL)
+            case TokenType.EQUAL_EQUAL:
+                compiler.emit(OP_EQUAL)
+            case TokenType.BANG_EQUAL:
+                compiler.emit(OP_NOT_EQUAL)
+
+
+    def toClosure(self, interpreter):
+        left = self.left.toClosure(interpreter)
+
+        # A literal right operand (`n - 1`, `i < 10`) is baked in as a constant.
+        if isinstance(self.right, LiteralExpr):
+            value = self.right.evaluate(interpreter)
+            match(self.operator.type):
+                case TokenType.PLUS:
+                    right = lambda environment: value
+                case TokenType.MINUS | TokenType.STAR | TokenType.SLASH if not isinstance(value, float):
+                    right = lambda environment: value
+                case TokenType.MINUS:
+                    def subtract(environment):
+                        a = left(environment)
+                        if type(a) is float:
+                            return a - value
+                        self.typeError(a, value)
+                    return subtract
+                case TokenType.STAR:
+                    def multiply(environment):
+                        a = left(environment)
+                        if type(a) is float:
+                            return a * value
+                        self.typeError(a, value)
+                    return multiply
+                case TokenType.SLASH:
+                    def divide(environment):
+                        a = left(environment)
+                        if type(a) is float:
+                            return a / value
+                        self.typeError(a, value)
+                    return divide
+                case TokenType.MOD:
+                    return lambda environment: left(environment) % value
+                case TokenType.GREATER:
+                    return lambda environment: left(environment) > value
+                case TokenType.GREATER_EQUAL:
+                    return lambda environment: left(environment) >= value
+                case TokenType.LESS:
+                    return lambda environment: left(environment) < value
+                case TokenType.LESS_EQUAL:
+                    return lambda environment: left(environment) <= value
+                case TokenType.EQUAL_EQUAL:
+                    return lambda environment: left(environment) == value
+                case TokenType.BANG_EQUAL:
+                    return lambda environment: left(environment) != value
+        else:
+            right = self.right.toClosure(interpreter)
+
+        match(self.operator.type):
+            case TokenType.PLUS:
+                def add(environment):
+                    a = left(environment)
+                    b = right(environment)
+                    if isinstance(a, float) and isinstance(b, float):
+                        return a + b
+                    if isinstance(a, str) and isinstance(b, str):
+                        return a + b
+                    self.typeError(a, b)
+                return add
             case TokenType.MINUS:
-                return left - right
+                def subtract(environment):
+                    a = left(environment)
+                    b = right(environment)
+                    if type(a) is float and type(b) is float:
+                        return a - b
+                    self.typeError(a, b)
+                return subtract
             case TokenType.STAR:
-                return left * right
+                def multiply(environment):
+                    a = left(environment)
+                    b = right(environment)
+                    if type(a) is float and type(b) is float:
+                        return a * b
+                    self.typeError(a, b)
+                return multiply
             case TokenType.SLASH:
-                return left / right
+                def divide(environment):
+                    a = left(environment)
+                    b = right(environment)
+                    if type(a) is float and type(b) is float:
+                        return a / b
+                    self.typeError(a, b)
+                return divide
             case TokenType.MOD:
-                return left % right;
+                return lambda environment: left(environment) % right(environment)
             case TokenType.GREATER:
-                return left > right
+                return lambda environment: left(environment) > right(environment)
             case TokenType.GREATER_EQUAL:
-                return left >= right
+                return lambda environment: left(environment) >= right(environment)
             case TokenType.LESS:
-                return left < right
+                return lambda environment: left(environment) < right(environment)
             case TokenType.LESS_EQUAL:
-                return left <= right
+                return lambda environment: left(environment) <= right(environment)
             case TokenType.EQUAL_EQUAL:
-                return left == right
+                return lambda environment: left(environment) == right(environment)
             case TokenType.BANG_EQUAL:
-                return left != right
+                return lambda environment: left(environment) != right(environment)
+
+
+    def transpile(self, transpiler):
+        match(self.operator.type):
+            case TokenType.PLUS:
+                return transpiler.arithmetic(self, '+')
+            case TokenType.MINUS:
+                return transpiler.arithmetic(self, '-')
+            case TokenType.STAR:
+                return transpiler.arithmetic(self, '*')
+            case TokenType.SLASH:
+                return transpiler.arithmetic(self, '/')
+            case TokenType.MOD:
+                operator = '%'
+            case TokenType.GREATER:
+                operator = '>'
+            case TokenType.GREATER_EQUAL:
+                operator = '>='
+            case TokenType.LESS:
+                operator = '<'
+            case TokenType.LESS_EQUAL:
+                operator = '<='
+            case TokenType.EQUAL_EQUAL:
+                operator = '=='
+            case TokenType.BANG_EQUAL:
+                operator = '!='
+        return f"({self.left.transpile(transpiler)} {operator} {self.right.transpile(transpiler)})"
+
+
+    def optimize(self, optimizer):
+        self.left = self.left.optimize(optimizer)
+        self.right = self.right.optimize(optimizer)
+        return optimizer.fold(self)
+
+
+    def typeError(self, left, right):
+        print(f"Type error, unsupported operator {self.operator.type.name} for operand types {type(left)} and {type(right)}")
+        exit(1)
 
 
-    def resolve(self, resolver):
-        self.left.resolve(resolver)
-        self.right.resolve(resolver)
-    
     def __str__(self):
         return f'({self.left} {self.operator.type.name} {self.right})'
 
+
+# One subclass per operator, so evaluate does no dispatch of its own. The
+# other passes are shared with BinaryExpr and still switch on the operator.
+
+# Nodes that quicken rewrite themselves in place, by swapping __class__, into
+# a version specialized for the first values they see. When a specialized
+# node's guard fails it falls back to a generic version for good.
+
+class AddExpr(BinaryExpr):
+    __slots__ = ()
+
+    def evaluate(self, interpreter):
+        left = self.left.evaluate(interpreter)
+        right = self.right.evaluate(interpreter)
+        if type(left) is float and type(right) is float:
+            self.__class__ = AddNumbersExpr
+            return left + right
+        if type(left) is str and type(right) is str:
+            self.__class__ = AddStringsExpr
+            return left + right
+        self.typeError(left, right)
+
+
+    def add(self, left, right):
+        if type(left) is float and type(right) is float:
+            return left + right
+        if type(left) is str and type(right) is str:
+            return left + right
+        self.typeError(left, right)
+
+
+class AddNumbersExpr(AddExpr):
+    __slots__ = ()
+
+    def evaluate(self, interpreter):
+        left = self.left.evaluate(interpreter)
+        right = self.right.evaluate(interpreter)
+        if type(left) is float and type(right) is float:
+            return left + right
+        self.__class__ = GenericAddExpr
+        return self.add(left, right)
+
+
+class AddStringsExpr(AddExpr):
+    __slots__ = ()
+
+    def evaluate(self, interpreter):
+        left = self.left.evaluate(interpreter)
+        right = self.right.evaluate(interpreter)
+        if type(left) is str and type(right) is str:
+            return left + right
+        self.__class__ = GenericAddExpr
+        return self.add(left, right)
+
+
+class GenericAddExpr(AddExpr):
+    __slots__ = ()
+
+    def evaluate(self, interpreter):
+        return self.add(self.left.evaluate(interpreter), self.right.evaluate(interpreter))
+
+
+class SubtractExpr(BinaryExpr):
+    __slots__ = ()
+
+    def evaluate(self, interpreter):
+        left = self.left.evaluate(interpreter)
+        right = self.right.evaluate(interpreter)
+        if type(left) is float and type(right) is float:
+            return left - right
+        self.typeError(left, right)
+
+
+class MultiplyExpr(BinaryExpr):
+    __slots__ = ()
+
+    def evaluate(self, interpreter):
+        left = self.left.evaluate(interpreter)
+        right = self.right.evaluate(interpreter)
+        if type(left) is float and type(right) is float:
+            return left * right
+        self.typeError(left, right)
+
+
+class DivideExpr(BinaryExpr):
+    __slots__ = ()
+
+    def evaluate(self, interpreter):
+        left = self.left.evaluate(interpreter)
+        right = self.right.evaluate(interpreter)
+        if type(left) is float and type(right) is float:
+            return left / right
+        self.typeError(left, right)
+
+
+class ModuloExpr(BinaryExpr):
+    __slots__ = ()
+
+    def evaluate(self, interpreter):
+        return self.left.evaluate(interpreter) % self.right.evaluate(interpreter)
+
+
+class GreaterExpr(BinaryExpr):
+    __slots__ = ()
+
+    def evaluate(self, interpreter):
+        return self.left.evaluate(interpreter) > self.right.evaluate(interpreter)
+
+
+class GreaterEqualExpr(BinaryExpr):
+    __slots__ = ()
+
+    def evaluate(self, interpreter):
+        return self.left.evaluate(interpreter) >= self.right.evaluate(interpreter)
+
+
+class LessExpr(BinaryExpr):
+    __slots__ = ()
+
+    def evaluate(self, interpreter):
+        return self.left.evaluate(interpreter) < self.right.evaluate(interpreter)
+
+
+class LessEqualExpr(BinaryExpr):
+    __slots__ = ()
+
+    def evaluate(self, interpreter):
+        return self.left.evaluate(interpreter) <= self.right.evaluate(interpreter)
+
+
+class EqualExpr(BinaryExpr):
+    __slots__ = ()
+
+    def evaluate(self, interpreter):
+        return self.left.evaluate(interpreter) == self.right.evaluate(interpreter)
+
+
+class NotEqualExpr(BinaryExpr):
+    __slots__ = ()
+
+    def evaluate(self, interpreter):
+        return self.left.evaluate(interpreter) != self.right.evaluate(interpreter)
+
+
+BINARY_NODES = {
+    TokenType.PLUS          : AddExpr,
+    TokenType.MINUS         : SubtractExpr,
+    TokenType.STAR          : MultiplyExpr,
+    TokenType.SLASH         : DivideExpr,
+    TokenType.MOD           : ModuloExpr,
+    TokenType.GREATER       : GreaterExpr,
+    TokenType.GREATER_EQUAL : GreaterEqualExpr,
+    TokenType.LESS          : LessExpr,
+    TokenType.LESS_EQUAL    : LessEqualExpr,
+    TokenType.EQUAL_EQUAL   : EqualExpr,
+    TokenType.BANG_EQUAL    : NotEqualExpr,
+}
+
+
+def makeBinary(left, operator, right) -> BinaryExpr:
+    return BINARY_NODES[operator.type](left, operator, right)
+
     
 class UnaryExpr(Expr):
+    __slots__ = ('operator', 'right')
+
     def __init__(self, operator, right):
         self.operator: TokenType = operator
         self.right: Expr = right
@@ -83,11 +410,46 @@ class UnaryExpr(Expr):
     def resolve(self, resolver):
         self.right.resolve(resolver)
 
+    def compile(self, compiler):
+        self.right.compile(compiler)
+
+        match(self.operator.type):
+            case TokenType.MINUS:
+                compiler.emit(OP_NEGATE)
+            case TokenType.BANG:
+                compiler.emit(OP_NOT)
+
+
+    def toClosure(self, interpreter):
+        right = self.right.toClosure(interpreter)
+
+        match(self.operator.type):
+            case TokenType.MINUS:
+                return lambda environment: -right(environment)
+            case TokenType.BANG:
+                return lambda environment: not right(environment)
+
+
+    def transpile(self, transpiler):
+        match(self.operator.type):
+            case TokenType.MINUS:
+                return f"(-{self.right.transpile(transpiler)})"
+            case TokenType.BANG:
+                return f"(not {self.right.transpile(transpiler)})"
+
+
+    def optimize(self, optimizer):
+        self.right = self.right.optimize(optimizer)
+        return optimizer.fold(self)
+
+
     def __str__(self):
         return f'({self.operator.type.name} {self.right})'
 
 
 class LiteralExpr(Expr):
+    __slots__ = ('value',)
+
     def __init__(self, value):
         self.value = value
 
@@ -99,6 +461,30 @@ class LiteralExpr(Expr):
     def resolve(self, resolver):
         return
 
+    def compile(self, compiler):
+        if self.value is True:
+            compiler.emit(OP_TRUE)
+        elif self.value is False:
+            compiler.emit(OP_FALSE)
+        elif self.value == None:
+            compiler.emit(OP_NIL)
+        else:
+            compiler.emitConstant(self.value)
+
+
+    def toClosure(self, interpreter):
+        value = self.evaluate(interpreter)
+        return lambda environment: value
+
+
+    def transpile(self, transpiler):
+        return repr(self.evaluate(None))
+
+
+    def optimize(self, optimizer):
+        return self
+
+
     def __str__(self):
         if self.value == None:
             return 'nil'
@@ -108,6 +494,8 @@ class LiteralExpr(Expr):
 
 
 class LogicalExpr(Expr):
+    __slots__ = ('left', 'operator', 'right')
+
     def __init__(self, left, operator, right):
         self.left = left
         self.operator = operator
@@ -127,11 +515,50 @@ class LogicalExpr(Expr):
         self.right.resolve(resolver)
     
 
+    def compile(self, compiler):
+        self.left.compile(compiler)
+
+        if self.operator.type == TokenType.OR:
+            elseJump = compiler.emitJump(OP_JUMP_IF_FALSE)
+            endJump = compiler.emitJump(OP_JUMP)
+            compiler.patchJump(elseJump)
+        else:
+            endJump = compiler.emitJump(OP_JUMP_IF_FALSE)
+
+        compiler.emit(OP_POP)
+        self.right.compile(compiler)
+        compiler.patchJump(endJump)
+
+
+    def toClosure(self, interpreter):
+        left = self.left.toClosure(interpreter)
+        right = self.right.toClosure(interpreter)
+
+        match(self.operator.type):
+            case TokenType.OR:
+                return lambda environment: left(environment) or right(environment)
+            case TokenType.AND:
+                return lambda environment: left(environment) and right(environment)
+
+
+    def transpile(self, transpiler):
+        operator = 'or' if self.operator.type == TokenType.OR else 'and'
+        return f"({self.left.transpile(transpiler)} {operator} {self.right.transpile(transpiler)})"
+
+
+    def optimize(self, optimizer):
+        self.left = self.left.optimize(optimizer)
+        self.right = self.right.optimize(optimizer)
+        return optimizer.logical(self)
+
+
     def __str__(self):
         return f'({self.left} {self.operator.type.name} {self.right})'
 
     
 class GroupingExpr(Expr):
+    __slots__ = ('expression',)
+
     def __init__(self, expression):
         self.expression: Expr = expression
 
@@ -144,17 +571,40 @@ class GroupingExpr(Expr):
         self.expression.resolve(resolver)
 
     
+    def compile(self, compiler):
+        self.expression.compile(compiler)
+
+
+    def toClosure(self, interpreter):
+        return self.expression.toClosure(interpreter)
+
+
+    def transpile(self, transpiler):
+        return self.expression.transpile(transpiler)
+
+
+    def optimize(self, optimizer):
+        self.expression = self.expression.optimize(optimizer)
+        if optimizer.enabled('fold'):
+            return self.expression
+        return self
+
+
     def __str__(self):
         return f'({self.expression})'
 
 
 class VarExpr(Expr):
+    __slots__ = ('name', 'depth', 'slot')
+
     def __init__(self, name: str):
         self.name = name
+        self.depth: int = None
+        self.slot: int = None
 
     
     def evaluate(self, interpreter):
-        return interpreter.lookUpVar(self.name, self)
+        return interpreter.lookUpVar(self)
     
     
     def resolve(self, resolver):
@@ -164,20 +614,39 @@ class VarExpr(Expr):
         resolver.resolveLocal(self, self.name)
 
     
+    def compile(self, compiler):
+        compiler.getVariable(self.name)
+
+
+    def toClosure(self, interpreter):
+        return interpreter.reader(self)
+
+
+    def transpile(self, transpiler):
+        return transpiler.load(self.name)
+
+
+    def optimize(self, optimizer):
+        return self
+
+
     def __str__(self):
         return f'(var {self.name})'
 
 
 class AssignExpr(Expr):
+    __slots__ = ('name', 'expression', 'depth', 'slot')
+
     def __init__(self, name, expression):
         self.name = name
         self.expression = expression
+        self.depth: int = None
+        self.slot: int = None
     
 
     def evaluate(self, interpreter):
-        dist = interpreter.locals[self]
         value = self.expression.evaluate(interpreter)
-        interpreter.environment.assignAt(dist, self.name, value)
+        interpreter.assignVar(self, value)
     
 
     def resolve(self, resolver):
@@ -185,11 +654,55 @@ class AssignExpr(Expr):
         resolver.resolveLocal(self, self.name)
 
 
+    def compile(self, compiler):
+        self.expression.compile(compiler)
+        compiler.setVariable(self.name)
+
+
+    def toClosure(self, interpreter):
+        name = self.name
+        expression = self.expression.toClosure(interpreter)
+        dist = self.depth
+        slot = self.slot
+
+        if dist == None and slot == None:
+            def assign(environment):
+                value = expression(environment)
+                interpreter.assignGlobal(name, value)
+                return value
+        elif dist == None:
+            values = interpreter.globals.values
+            def assign(environment):
+                values[slot] = value = expression(environment)
+                return value
+        elif dist == 0:
+            def assign(environment):
+                environment.values[slot] = value = expression(environment)
+                return value
+        else:
+            def assign(environment):
+                environment.ancestor(dist).values[slot] = value = expression(environment)
+                return value
+        return assign
+
+
+    def transpile(self, transpiler):
+        value = self.expression.transpile(transpiler)
+        return transpiler.assign(self.name, value)
+
+
+    def optimize(self, optimizer):
+        self.expression = self.expression.optimize(optimizer)
+        return self
+
+
     def __str__(self):
         return f'(assign {self.name} = {self.expression})'
 
 
 class CallExpr(Expr):
+    __slots__ = ('callee', 'paren', 'arguments')
+
     def __init__(self, callee, paren, arguments):
         self.callee: Expr = callee
         self.paren: Token = paren
@@ -198,18 +711,38 @@ class CallExpr(Expr):
 
     def evaluate(self, interpeter):
         callee = self.callee.evaluate(interpeter)
+        if type(callee) is LoxFunction:
+            self.__class__ = FunctionCallExpr
+        elif type(callee) is LoxClass:
+            self.__class__ = ClassCallExpr
+        return self.call(interpeter, callee)
+
+
+    @staticmethod
+    def check(callee, argc: int) -> None:
         if not isinstance(callee, LoxCallable):
             print("Can only call functions and classes.")
             exit(1)
+        if argc != callee.arity():
+            print(f"Expected {callee.arity()} arguments but got {argc}.") 
+            exit(1)
 
-        arguments = []
-        for argument in self.arguments:
-            arguments.append(argument.evaluate(interpeter))
 
-        if len(arguments) != callee.arity():
-            print(f"Expected {callee.arity()} arguments but got {len(arguments)}.") 
-            exit(1)
+    def call(self, interpeter, callee):
+        arguments = [argument.evaluate(interpeter) for argument in self.arguments]
+        self.check(callee, len(arguments))
         return callee.call(interpeter, arguments)
+
+
+    def tailCall(self, interpreter):
+        # The call of a return in tail position: a Lox function is not called
+        # here but handed back to the function returning, see TailCall.
+        callee = self.callee.evaluate(interpreter)
+        arguments = [argument.evaluate(interpreter) for argument in self.arguments]
+        self.check(callee, len(arguments))
+        if isinstance(callee, LoxFunction):
+            return TailCall(callee, None, arguments)
+        return callee.call(interpreter, arguments)
     
 
     def resolve(self, resolver):
@@ -217,27 +750,129 @@ class CallExpr(Expr):
 
         for arg in self.arguments:
             arg.resolve(resolver)
-
-        for i in range(len(resolver.scopes) - 1, -1, -1):
-            if self.callee.name in resolver.scopes[i]:
-                resolver.interpreter.resolve(self, len(resolver.scopes) - i - 1)
-                return
     
 
+    def compile(self, compiler):
+        self.callee.compile(compiler)
+        for argument in self.arguments:
+            argument.compile(compiler)
+        compiler.emit(OP_CALL, compiler.argumentCount(self.arguments))
+
+
+    def toClosure(self, interpreter):
+        callee = self.callee.toClosure(interpreter)
+        arguments = [argument.toClosure(interpreter) for argument in self.arguments]
+        argc = len(arguments)
+
+        check = self.check
+
+        def call(environment):
+            function = callee(environment)
+            values = [argument(environment) for argument in arguments]
+            check(function, argc)
+            return function.call(interpreter, values)
+        return call
+
+
+    def toTailClosure(self, interpreter):
+        callee = self.callee.toClosure(interpreter)
+        arguments = [argument.toClosure(interpreter) for argument in self.arguments]
+        argc = len(arguments)
+        check = self.check
+
+        def call(environment):
+            function = callee(environment)
+            values = [argument(environment) for argument in arguments]
+            check(function, argc)
+            if isinstance(function, LoxFunction):
+                return TailCall(function, None, values)
+            return function.call(interpreter, values)
+        return call
+
+
+    def transpile(self, transpiler):
+        arguments = [argument.transpile(transpiler) for argument in self.arguments]
+
+        # super.method(...) calls the superclass function with 'this' directly.
+        if isinstance(self.callee, SuperExpr):
+            callee = f"{transpiler.load('super')}.{transpiler.attribute(self.callee.method.data)}"
+            return transpiler.call(callee, arguments, transpiler.load('this'))
+        return transpiler.call(self.callee.transpile(transpiler), arguments)
+
+
+    def optimize(self, optimizer):
+        self.callee = self.callee.optimize(optimizer)
+        self.arguments = [argument.optimize(optimizer) for argument in self.arguments]
+        return self
+
+
     def __str__(self):
         return "call"
     
 
+class FunctionCallExpr(CallExpr):
+    __slots__ = ()
+
+    def evaluate(self, interpeter):
+        callee = self.callee.evaluate(interpeter)
+        if type(callee) is not LoxFunction:
+            self.__class__ = GenericCallExpr
+            return self.call(interpeter, callee)
+
+        arguments = [argument.evaluate(interpeter) for argument in self.arguments]
+        if len(arguments) != len(callee.declaration.parameters):
+            print(f"Expected {callee.arity()} arguments but got {len(arguments)}.")
+            exit(1)
+        return callee.call(interpeter, arguments)
+
+
+class ClassCallExpr(CallExpr):
+    __slots__ = ()
+
+    def evaluate(self, interpeter):
+        callee = self.callee.evaluate(interpeter)
+        if type(callee) is not LoxClass:
+            self.__class__ = GenericCallExpr
+            return self.call(interpeter, callee)
+
+        arguments = [argument.evaluate(interpeter) for argument in self.arguments]
+        if len(arguments) != callee.initArity:
+            print(f"Expected {callee.initArity} arguments but got {len(arguments)}.")
+            exit(1)
+        return callee.call(interpeter, arguments)
+
+
+class GenericCallExpr(CallExpr):
+    __slots__ = ()
+
+    def evaluate(self, interpeter):
+        return self.call(interpeter, self.callee.evaluate(interpeter))
+
+
 class GetExpr(Expr):
+    __slots__ = ('obj', 'name', 'cache')
+
     def __init__(self, obj, name):
         self.obj = obj
         self.name = name
+        self.cache = InlineCache(name)
     
 
     def evaluate(self, interpreter):
         obj = self.obj.evaluate(interpreter)
+        if type(obj) is LoxInstance:
+            value = obj.getCached(self.cache)
+            if obj.shape is self.cache.shape:
+                self.__class__ = FieldGetExpr
+            elif obj.klass is self.cache.klass:
+                self.__class__ = MethodGetExpr
+            return value
+        return self.get(obj)
+
+
+    def get(self, obj):
         if isinstance(obj, LoxInstance):
-            return obj.get(self.name)
+            return obj.getCached(self.cache)
         print("Only instances have properties.")
         exit(1)
     
@@ -246,15 +881,191 @@ class GetExpr(Expr):
         self.obj.resolve(resolver)
     
 
+    def compile(self, compiler):
+        self.obj.compile(compiler)
+        compiler.emit(OP_GET_PROPERTY, compiler.constant(self.name))
+
+
+    def toClosure(self, interpreter):
+        obj = self.obj.toClosure(interpreter)
+        cache = self.cache
+
+        def get(environment):
+            instance = obj(environment)
+            if isinstance(instance, LoxInstance):
+                return instance.getCached(cache)
+            print("Only instances have properties.")
+            exit(1)
+        return get
+
+
+    def transpile(self, transpiler):
+        return transpiler.property(self.obj, self.name)
+
+
+    def optimize(self, optimizer):
+        self.obj = self.obj.optimize(optimizer)
+        return self
+
+
     def __str__(self):
         return f"(get {self.name})"
 
 
+class FieldGetExpr(GetExpr):
+    __slots__ = ()
+
+    def evaluate(self, interpreter):
+        obj = self.obj.evaluate(interpreter)
+        if type(obj) is LoxInstance and obj.shape is self.cache.shape:
+            return obj.values[self.cache.index]
+        self.__class__ = GenericGetExpr
+        return self.get(obj)
+
+
+class MethodGetExpr(GetExpr):
+    __slots__ = ()
+
+    def evaluate(self, interpreter):
+        obj = self.obj.evaluate(interpreter)
+        cache = self.cache
+        if type(obj) is LoxInstance and obj.klass is cache.klass and cache.name not in obj.shape.slots:
+            return cache.method.bind(obj)
+        self.__class__ = GenericGetExpr
+        return self.get(obj)
+
+
+class GenericGetExpr(GetExpr):
+    __slots__ = ()
+
+    def evaluate(self, interpreter):
+        return self.get(self.obj.evaluate(interpreter))
+
+
+class InvokeExpr(Expr):
+    __slots__ = ('obj', 'name', 'paren', 'arguments', 'cache')
+
+    # obj.name(arguments), fused so a method is called with its receiver
+    # directly instead of going through a bound LoxFunction.
+    def __init__(self, obj, name, paren, arguments):
+        self.obj: Expr = obj
+        self.name: str = name
+        self.paren: Token = paren
+        self.arguments: list[Expr] = arguments
+        self.cache = InlineCache(name)
+
+
+    def target(self, obj, argc: int) -> tuple:
+        # The callee and the receiver to invoke it on; a function stored in
+        # a field is called as it is, with no receiver.
+        if not isinstance(obj, LoxInstance):
+            print("Only instances have properties.")
+            exit(1)
+
+        index = obj.fieldIndex(self.cache)
+        if index != None:
+            callee = obj.values[index]
+            CallExpr.check(callee, argc)
+            return callee, None
+
+        method = self.cache.lookUp(obj.klass)
+        if method == None:
+            print(f"Undefined property {self.name}.")
+            exit(1)
+        if argc != method.arity():
+            print(f"Expected {method.arity()} arguments but got {argc}.")
+            exit(1)
+        return method, obj
+
+
+    def evaluate(self, interpreter):
+        obj = self.obj.evaluate(interpreter)
+        arguments = [argument.evaluate(interpreter) for argument in self.arguments]
+        callee, receiver = self.target(obj, len(arguments))
+        if receiver == None:
+            return callee.call(interpreter, arguments)
+        return callee.invoke(interpreter, receiver, arguments)
+
+
+    def tailCall(self, interpreter):
+        obj = self.obj.evaluate(interpreter)
+        arguments = [argument.evaluate(interpreter) for argument in self.arguments]
+        callee, receiver = self.target(obj, len(arguments))
+        if isinstance(callee, LoxFunction):
+            return TailCall(callee, receiver, arguments)
+        return callee.call(interpreter, arguments)
+
+
+    def resolve(self, resolver):
+        self.obj.resolve(resolver)
+
+        for arg in self.arguments:
+            arg.resolve(resolver)
+
+
+    def compile(self, compiler):
+        self.obj.compile(compiler)
+        for argument in self.arguments:
+            argument.compile(compiler)
+        compiler.emit(OP_INVOKE, compiler.constant(self.name) << 8 | compiler.argumentCount(self.arguments))
+
+
+    def toClosure(self, interpreter):
+        obj = self.obj.toClosure(interpreter)
+        arguments = [argument.toClosure(interpreter) for argument in self.arguments]
+        argc = len(arguments)
+        target = self.target
+
+        def invoke(environment):
+            instance = obj(environment)
+            values = [argument(environment) for argument in arguments]
+            callee, receiver = target(instance, argc)
+            if receiver == None:
+                return callee.call(interpreter, values)
+            return callee.invoke(interpreter, receiver, values)
+        return invoke
+
+
+    def toTailClosure(self, interpreter):
+        obj = self.obj.toClosure(interpreter)
+        arguments = [argument.toClosure(interpreter) for argument in self.arguments]
+        argc = len(arguments)
+        target = self.target
+
+        def invoke(environment):
+            instance = obj(environment)
+            values = [argument(environment) for argument in arguments]
+            callee, receiver = target(instance, argc)
+            if isinstance(callee, LoxFunction):
+                return TailCall(callee, receiver, values)
+            return callee.call(interpreter, values)
+        return invoke
+
+
+    def transpile(self, transpiler):
+        method = transpiler.property(self.obj, self.name)
+        arguments = [argument.transpile(transpiler) for argument in self.arguments]
+        return transpiler.call(method, arguments)
+
+
+    def optimize(self, optimizer):
+        self.obj = self.obj.optimize(optimizer)
+        self.arguments = [argument.optimize(optimizer) for argument in self.arguments]
+        return self
+
+
+    def __str__(self):
+        return f"(invoke {self.name})"
+
+
 class SetExpr(Expr):
+    __slots__ = ('obj', 'name', 'value', 'cache')
+
     def __init__(self, obj, name, value):
         self.obj = obj
         self.name = name
         self.value = value
+        self.cache = InlineCache(name)
     
 
     def evaluate(self, interpreter):
@@ -265,7 +1076,7 @@ class SetExpr(Expr):
             exit(1)
         
         value = self.value.evaluate(interpreter)
-        obj.set(self.name, value)
+        obj.setCached(self.cache, value)
         return value
     
 
@@ -274,45 +1085,103 @@ class SetExpr(Expr):
         self.value.resolve(resolver)
     
 
+    def compile(self, compiler):
+        self.obj.compile(compiler)
+        self.value.compile(compiler)
+        compiler.emit(OP_SET_PROPERTY, compiler.constant(self.name))
+
+
+    def toClosure(self, interpreter):
+        obj = self.obj.toClosure(interpreter)
+        cache = self.cache
+        expression = self.value.toClosure(interpreter)
+
+        def set(environment):
+            instance = obj(environment)
+            if not isinstance(instance, LoxInstance):
+                print("Only instances have fields.")
+                exit(1)
+
+            value = expression(environment)
+            instance.setCached(cache, value)
+            return value
+        return set
+
+
+    def transpile(self, transpiler):
+        return f"_set({self.obj.transpile(transpiler)}, '{transpiler.attribute(self.name)}', {self.value.transpile(transpiler)})"
+
+
+    def optimize(self, optimizer):
+        self.obj = self.obj.optimize(optimizer)
+        self.value = self.value.optimize(optimizer)
+        return self
+
+
     def __str__(self):
         return f"(set {self.name})"
 
 
 class ThisExpr(Expr):
+    __slots__ = ('keyword', 'name', 'depth', 'slot')
+
     def __init__(self, keyword):
         self.keyword = keyword
+        self.name = 'this'
+        self.depth: int = None
+        self.slot: int = None
     
 
     def evaluate(self, interpreter):
-        return interpreter.lookUpVar('this', self.keyword)
+        return interpreter.lookUpVar(self)
     
     
     def resolve(self, resolver):
         if resolver.currentFunction != 'method':
             print("Can't use 'this' outside of a class.")
             exit(1)
-        resolver.resolveLocal(self.keyword, 'this')
+        resolver.resolveLocal(self, 'this')
     
 
+    def compile(self, compiler):
+        compiler.getVariable('this')
+
+
+    def toClosure(self, interpreter):
+        return interpreter.reader(self)
+
+
+    def transpile(self, transpiler):
+        return transpiler.load('this')
+
+
+    def optimize(self, optimizer):
+        return self
+
+
     def __str__(self):
         return f"(this {self.keyword})"
 
 
 class SuperExpr(Expr):
+    __slots__ = ('keyword', 'name', 'method', 'depth', 'slot', 'cache')
+
     def __init__(self, keyword, method):
         self.keyword = keyword
         self.name = 'super'
         self.method = method
+        self.depth: int = None
+        self.slot: int = None
+        self.cache = InlineCache(method.data)
     
 
     def evaluate(self, interpreter):
-        distance = interpreter.locals[self.keyword]
-        superclass = interpreter.environment.getAt(distance, 'super')
-        obj = interpreter.environment.getAt(distance - 1, 'this')
-        method = superclass.findMethod(self.method.data)
+        superclass = interpreter.environment.getAt(self.depth, self.slot)
+        obj = interpreter.environment.getAt(self.depth - 1, 0)
+        method = self.cache.lookUp(superclass)
 
         if method == None:
-            print(f"Undefined property {method}.")
+            print(f"Undefined property {self.method.data}.")
             exit(1)
         
         return method.bind(obj)
@@ -320,8 +1189,41 @@ class SuperExpr(Expr):
 
     def resolve(self, resolver):
         # print("DEBUG: SuperExpr resolve()")
-        resolver.resolveLocal(self.keyword, 'super')
+        resolver.resolveLocal(self, 'super')
     
 
+    def compile(self, compiler):
+        compiler.getVariable('this')
+        compiler.getVariable('super')
+        compiler.emit(OP_GET_SUPER, compiler.constant(self.method.data))
+
+
+    def toClosure(self, interpreter):
+        distance = self.depth
+        slot = self.slot
+        cache = self.cache
+        name = self.method.data
+
+        def method(environment):
+            superclass = environment.getAt(distance, slot)
+            obj = environment.getAt(distance - 1, 0)
+            method = cache.lookUp(superclass)
+
+            if method == None:
+                print(f"Undefined property {name}.")
+                exit(1)
+
+            return method.bind(obj)
+        return method
+
+
+    def transpile(self, transpiler):
+        return f"_MethodType({transpiler.load('super')}.{transpiler.attribute(self.method.data)}, {transpiler.load('this')})"
+
+
+    def optimize(self, optimizer):
+        return self
+
+
     def __str__(self):
         return f"(super {self.keyword})"
\ No newline at end of file
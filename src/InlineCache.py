@@ -0,0 +1,42 @@
+POLYMORPHIC_LIMIT = 4
+
+
+class InlineCache:
+    __slots__ = ('name', 'klass', 'method', 'entries', 'shape', 'index')
+
+    # Caches a method lookup for a single call site, keyed by the receiver's
+    # class. The last class seen is checked first; other classes go in a small
+    # table, which is reset once the site turns out to be megamorphic.
+    # A class's methods never change, and redefining a class creates a new
+    # LoxClass, so the old entries simply stop matching and age out.
+    # Field accesses also remember the last Shape seen and the field's index
+    # in it, see LoxInstance.getCached.
+    def __init__(self, name: str):
+        self.name = name
+        self.klass = None
+        self.method = None
+        self.entries: dict = None
+        self.shape = None
+        self.index: int = None
+
+
+    def lookUp(self, klass):
+        if klass is self.klass:
+            return self.method
+
+        entries = self.entries
+        if entries == None:
+            entries = self.entries = {}
+
+        if klass in entries:
+            method = entries[klass]
+        else:
+            method = klass.findMethod(self.name)
+            if len(entries) >= POLYMORPHIC_LIMIT:
+                entries.clear()
+            entries[klass] = method
+
+        self.klass = klass
+        self.method = method
+        return method
+
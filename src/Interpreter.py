@@ -5,6 +5,8 @@ from Environment import *
 from LoxCallable import LoxCallable
 
 class ClockFn(LoxCallable):
+    __slots__ = ()
+
     def arity(self):
         return 0
     
@@ -18,26 +20,85 @@ class ClockFn(LoxCallable):
 
 
 class Interpreter:
-    def __init__(self, statements: list[Stmt]):
+    def __init__(self, statements: list[Stmt], compileClosures: bool = False):
         self.statements = statements
-        self.environment = Environment() 
-        self.locals = dict()
-        self.environment.values["clock"] = ClockFn()
+        self.natives = {"clock": ClockFn()}
+        self.environment = Environment(None, list(self.natives.values()))
+        self.globals = self.environment
+        self.globalSlots = dict()
+        self.compileClosures = compileClosures
+        # Set by a return statement for the function it returns from.
+        self.returnValue = "nil"
 
     
     def interpret(self):
         try:
-            for statement in self.statements:
-                statement.execute(self)
+            if self.compileClosures:
+                program = [statement.toClosure(self) for statement in self.statements]
+                for statement in program:
+                    statement(self.environment)
+            else:
+                for statement in self.statements:
+                    statement.execute(self)
         except Exception as e:
             print("Runtime error", {e})
             exit(1)
     
 
-    def resolve(self, expr: Expr, depth: int):
-        self.locals[expr] = depth
-    
+    def lookUpVar(self, expr: Expr):
+        if expr.depth == None:
+            if expr.slot == None:
+                return self.lookUpGlobal(expr.name)
+            return self.globals.values[expr.slot]
+
+        environment = self.environment
+        for _ in range(expr.depth):
+            environment = environment.enclosing
+        return environment.values[expr.slot]
+
+
+    def assignVar(self, expr: Expr, value) -> None:
+        if expr.depth == None:
+            if expr.slot == None:
+                self.assignGlobal(expr.name, value)
+            else:
+                self.globals.values[expr.slot] = value
+            return
+
+        environment = self.environment
+        for _ in range(expr.depth):
+            environment = environment.enclosing
+        environment.values[expr.slot] = value
+
+
+    def lookUpGlobal(self, name: str):
+        # Names the resolver could not bind, e.g. a function that refers to a
+        # global declared further down, are looked up when they are read.
+        slot = self.globalSlots.get(name)
+        if slot == None or slot >= len(self.globals.values):
+            raise NameError(f"Undefined variable '{name}'.")
+        return self.globals.values[slot]
+
+
+    def assignGlobal(self, name: str, value) -> None:
+        slot = self.globalSlots.get(name)
+        if slot == None or slot >= len(self.globals.values):
+            raise NameError(f"Undefined variable '{name}'.")
+        self.globals.values[slot] = value
+
+
+    def reader(self, expr: Expr):
+        name = expr.name
+        slot = expr.slot
+        if expr.depth == None:
+            if slot == None:
+                return lambda environment: self.lookUpGlobal(name)
+            values = self.globals.values
+            return lambda environment: values[slot]
 
-    def lookUpVar(self, name: str, expr: Expr):
-        dist = self.locals[expr]
-        return self.environment.getAt(dist, name)
\ No newline at end of file
+        dist = expr.depth
+        if dist == 0:
+            return lambda environment: environment.values[slot]
+        if dist == 1:
+            return lambda environment: environment.enclosing.values[slot]
+        return lambda environment: environment.ancestor(dist).values[slot]
\ No newline at end of file
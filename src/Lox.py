@@ -1,42 +1,181 @@
+import time
+
+# Taken before anything else is imported, for --startup-profile.
+STARTED = time.perf_counter()
+
 import sys
-from Token import *
-from Scanner import *
-from Parser import *
-from Interpreter import *
+import hashlib
+from contextlib import contextmanager
+from Interpreter import Interpreter
 from Resolver import Resolver
+from Optimizer import Optimizer, PASSES
+from ProgramCache import ProgramCache
+from StartupProfile import StartupProfile
+
+# The scanner and parser, the backends, the Python translator, the REPL
+# session and the profilers are imported when first used: a program loaded
+# from the cache is never scanned or parsed, and a run uses a single backend.
+
+BACKENDS = ('tree', 'closure', 'vm', 'python')
+
+
+@contextmanager
+def openSource(path: str):
+    try:
+        with open(path, 'rb') as file:
+            yield file
+    except FileNotFoundError:
+        print(f"I/O error: File '{path}' does not exist")
+        exit(1)
+    except PermissionError:
+        print(f"I/O error: Access denied")
+        exit(1)
+    except IOError as e:
+        print(f"I/O error: {e}")
+        exit(1)
+
 
 class Lox:
-    def run(self, source: str) -> None:
+    def __init__(self, backend: str = 'tree', passes=PASSES, report: bool = False, compactTokens: bool = False,
+                 cache: ProgramCache = None, prelude: str = None, profile: StartupProfile = None,
+                 profiler = None, sampler = None):
+        self.backend = backend
+        self.passes = passes
+        self.report = report
+        self.compactTokens = compactTokens
+        self.cache = cache
+        self.prelude = prelude
+        self.profile = profile
+        self.profiler = profiler
+        self.sampler = sampler
+
+
+    def enter(self, phase: str) -> None:
+        if self.profile != None:
+            self.profile.enter(phase)
+
+
+    def analyze(self, source, key: str = None) -> Interpreter:
+        # With a cache key, the resolved program is loaded from the cache, or
+        # stored there once analyzed. It is saved before anything runs, while
+        # no inline cache or quickened node holds run-time state.
+        if key != None:
+            self.enter('cache')
+            program = self.cache.load(key)
+            if program != None:
+                statements, globalSlots = program
+                interpreter = Interpreter(statements, self.backend == 'closure')
+                interpreter.globalSlots = globalSlots
+                return interpreter
+
+        self.enter('import')
+        from Scanner import Scanner
+        from Parser import Parser, CompactParser
+
+        self.enter('scan')
         scanner = Scanner(source)
-        tokens = scanner.scan()
+        if self.compactTokens:
+            tokens = scanner.scanCompact()
+        elif self.profile != None:
+            # Scanned up front, so that scanning and parsing are timed apart.
+            tokens = scanner.scan()
+        else:
+            tokens = scanner.stream()
 
-        parser = Parser(tokens)
+        self.enter('parse')
+        parser = CompactParser(tokens) if self.compactTokens else Parser(tokens)
         statements = parser.parse()
 
-        interpreter = Interpreter(statements)
+        self.enter('optimize')
+        optimizer = Optimizer(statements, self.passes)
+        statements = optimizer.optimize()
+        if self.report:
+            optimizer.report()
+
+        self.enter('resolve')
+        interpreter = Interpreter(statements, self.backend == 'closure')
         resolver = Resolver(interpreter)
 
         resolver.resolve()
-        interpreter.interpret()
+        if key != None:
+            self.enter('cache')
+            self.cache.store(key, (interpreter.statements, interpreter.globalSlots))
+        return interpreter
+
+
+    def run(self, source, key: str = None) -> None:
+        if self.backend == 'python':
+            self.runPython(source, key)
+            return
+
+        interpreter = self.analyze(source, key)
+
+        if self.backend == 'vm':
+            self.enter('import')
+            from Compiler import Compiler
+            from VM import VM
+
+            self.enter('compile')
+            script = Compiler().compile(interpreter.statements)
+            self.enter('execute')
+            VM().interpret(script)
+        else:
+            self.enter('execute')
+            if self.profiler == None and self.sampler == None:
+                interpreter.interpret()
+                return
+
+            from Profiler import profiling
+            with profiling(interpreter, self.profiler, self.sampler):
+                interpreter.interpret()
+
+
+    def runPython(self, source, key: str = None) -> None:
+        self.enter('import')
+        from Transpiler import Transpiler
+
+        self.enter('scan')
+        if not isinstance(source, str):
+            source = source.read()
+            if isinstance(source, bytes):
+                source = source.decode()
+        hash = hashlib.sha256(f"{sorted(self.passes)}\n{source}".encode()).hexdigest()
+        code = Transpiler.cache.get(hash)
+
+        if code == None:
+            statements = self.analyze(source, key).statements
+            self.enter('compile')
+            code = compile(Transpiler().transpile(statements), "<lox>", "exec")
+            Transpiler.cache[hash] = code
+
+        self.enter('execute')
+        Transpiler.execute(code)
 
 
     def runFile(self, path: str) -> None:
-        try:
-            with open(path) as file:
-                data = file.read()
-                self.run(data)
-        except FileNotFoundError:
-            print(f"I/O error: File '{path}' does not exist")
-            exit(1)
-        except PermissionError:
-            print(f"I/O error: Access denied")
-            exit(1)
-        except IOError as e:
-            print(f"I/O error: {e}")
-            exit(1)
+        with openSource(path) as file:
+            if self.cache == None:
+                self.run(file)
+                return
+
+            # The key covers the whole source, so the source is read into
+            # memory once and scanned from there; input that can only be read
+            # once, like a pipe, runs the same as a file.
+            self.enter('cache')
+            source = file.read()
+            key = self.cache.key(source, self.passes)
+            self.run(source.decode(), key)
 
 
     def runPromt(self) -> None:
+        from Session import Session
+
+        session = Session(self.backend, self.passes, self.profiler, self.sampler)
+        if self.prelude != None:
+            with openSource(self.prelude) as file:
+                if not session.run(file):
+                    exit(1)
+
         line = ""
         while True:
             try:
@@ -45,19 +184,77 @@ class Lox:
                 print()
                 sys.exit(0)
 
-            self.run(line)
+            session.run(line)
+
+
+def usage():
+    print(f"Wrong usage, correct usage: pylox [--backend={'|'.join(BACKENDS)}] [--optimize=none|{','.join(PASSES)}] [--optimize-report] [--compact-tokens] [--no-cache|--cache-dir=path] [--prelude=path] [--startup-profile] [--profile[=path.json]] [--sample[=path]] [path/to/script]")
+    sys.exit(1)
 
 
 def main():
-    lox = Lox()
-    argc = len(sys.argv)
-    if argc < 2:
-        lox.runPromt()
-    elif argc == 2:
-        lox.runFile(sys.argv[1])
-    else:
-        print("Wrong usage, correct usage: pylox path/to/script")
-        sys.exit(1)
+    backend = 'tree'
+    passes = PASSES
+    report = False
+    compactTokens = False
+    cache = ProgramCache()
+    prelude = None
+    profile = None
+    profiler = None
+    sampler = None
+    paths = []
+    for arg in sys.argv[1:]:
+        if arg.startswith('--backend='):
+            backend = arg[len('--backend='):]
+            if backend not in BACKENDS:
+                usage()
+        elif arg.startswith('--optimize='):
+            value = arg[len('--optimize='):]
+            passes = [] if value == 'none' else value.split(',')
+            if any(name not in PASSES for name in passes):
+                usage()
+        elif arg == '--optimize-report':
+            report = True
+        elif arg == '--compact-tokens':
+            compactTokens = True
+        elif arg == '--no-cache':
+            cache = None
+        elif arg.startswith('--cache-dir='):
+            cache = ProgramCache(arg[len('--cache-dir='):])
+        elif arg.startswith('--prelude='):
+            prelude = arg[len('--prelude='):]
+        elif arg == '--startup-profile':
+            profile = StartupProfile(STARTED)
+        elif arg == '--profile' or arg.startswith('--profile='):
+            from Profiler import Profiler
+            profiler = Profiler(arg[len('--profile='):] if '=' in arg else None)
+        elif arg == '--sample' or arg.startswith('--sample='):
+            from Sampler import Sampler
+            sampler = Sampler(arg[len('--sample='):] if '=' in arg else None)
+        else:
+            paths.append(arg)
+
+    # Only the tree and closure backends call Lox functions through the
+    # callables the profilers look for.
+    if (profiler != None or sampler != None) and backend not in ('tree', 'closure'):
+        usage()
+
+    if len(paths) > 1:
+        usage()
+
+    lox = Lox(backend, passes, report, compactTokens, cache, prelude, profile, profiler, sampler)
+    try:
+        if paths:
+            lox.runFile(paths[0])
+        else:
+            lox.runPromt()
+    finally:
+        if profiler != None:
+            profiler.report()
+        if sampler != None:
+            sampler.report()
+        if profile != None:
+            profile.report()
 
 
 if __name__ == '__main__':
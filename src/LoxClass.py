@@ -3,33 +3,35 @@ from LoxInstance import LoxInstance
 
 
 class LoxClass(LoxCallable):
+    __slots__ = ('name', 'superclass', 'methods', 'table', 'initializer', 'initArity')
+
     def __init__(self, name, superclass, methods):
         self.name = name
         self.superclass = superclass
         self.methods = methods
-    
+
+        # Classes can't change once defined, so inherited methods are copied
+        # down into one table and every lookup is a single dict access.
+        self.table = dict(superclass.table) if superclass != None else {}
+        self.table.update(methods)
+        self.initializer = self.table.get("init")
+        self.initArity = self.initializer.arity() if self.initializer != None else 0
+
 
     def call(self, envitonment, arguments):
         instance = LoxInstance(self)
-        if "init" in self.methods:
-            self.methods["init"].bind(instance).call(envitonment, arguments)
+        if self.initializer != None:
+            self.initializer.invoke(envitonment, instance, arguments)
         return instance
-    
+
 
     def arity(self):
-        if "init" in self.methods:
-            return self.methods["init"].arity()
-        return 0 
-    
+        return self.initArity
+
 
     def findMethod(self, name):
-        if name in self.methods:
-            return self.methods[name]
-        
-        if self.superclass != None:
-            return self.superclass.findMethod(name)
-    
+        return self.table.get(name)
+
 
     def __str__(self):
         return f"(class {self.name} inherit from {self.superclass})"
-        
\ No newline at end of file
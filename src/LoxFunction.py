@@ -1,8 +1,65 @@
 from LoxCallable import LoxCallable
 from Environment import Environment
-from ReturnException import ReturnException
+from Completion import RETURN
+
+
+class TailCall:
+    __slots__ = ('function', 'instance', 'arguments')
+
+    # Set by --profile while it runs, see Profiler.hop.
+    profiler = None
+
+    # What a return statement in tail position returns instead of calling a
+    # Lox function itself: the function that returns it runs the callee in
+    # its own Python frame, see run(), so tail calls don't nest.
+    def __init__(self, function, instance, arguments: list):
+        self.function = function
+        self.instance = instance
+        self.arguments = arguments
+
+
+    def run(self, interpreter):
+        environment = interpreter.environment
+        call = self
+        while True:
+            function = call.function
+            if TailCall.profiler != None:
+                TailCall.profiler.hop(function, call.instance)
+            closure = function.closure
+            if call.instance != None:
+                closure = Environment(closure, [call.instance])
+
+            if type(function) is CompiledFunction:
+                completion = function.body(Environment(closure, call.arguments))
+            else:
+                interpreter.environment = Environment(closure, call.arguments)
+                completion = function.declaration.body.execute(interpreter)
+            if completion is RETURN and type(interpreter.returnValue) is TailCall:
+                call = interpreter.returnValue
+                continue
+
+            interpreter.environment = environment
+            return complete(interpreter, completion, function, call.instance)
+
+
+def complete(interpreter, completion, function, instance):
+    # What a call of function returns once its body has completed; instance
+    # is the receiver of a method called without binding it.
+    if completion is RETURN:
+        value = interpreter.returnValue
+        if type(value) is TailCall:
+            return value.run(interpreter)
+        return value
+
+    declaration = function.declaration
+    if declaration.name == 'init' and declaration.kind == 'method':
+        return instance if instance != None else function.closure.values[0]
+    return 'nil'
+
 
 class LoxFunction(LoxCallable):
+    __slots__ = ('declaration', 'closure')
+
     def __init__(self, declaration, closure):
         self.declaration = declaration
         self.closure = closure
@@ -10,21 +67,27 @@ class LoxFunction(LoxCallable):
 
     def call(self, interpreter, arguments):
         tmp = interpreter.environment
-        interpreter.environment = Environment(self.closure)
+        # The argument list is built fresh for every call, so it becomes the
+        # parameters' slots as is.
+        interpreter.environment = Environment(self.closure, arguments)
 
-        for i in range(len(self.declaration.parameters)):
-            interpreter.environment.values[self.declaration.parameters[i].data] = arguments[i]
-        
         try:
-            self.declaration.body.execute(interpreter)
-        except ReturnException as e:
-            return e.value
+            completion = self.declaration.body.execute(interpreter)
         finally:
             interpreter.environment = tmp 
-        
-        if self.declaration.name == 'init' and self.declaration.kind == 'method':
-            return self.closure.values['this']
-        return 'nil'
+        return complete(interpreter, completion, self, None)
+    
+
+    def invoke(self, interpreter, instance, arguments):
+        # bind(instance).call(interpreter, arguments) without the bound function.
+        tmp = interpreter.environment
+        interpreter.environment = Environment(Environment(self.closure, [instance]), arguments)
+
+        try:
+            completion = self.declaration.body.execute(interpreter)
+        finally:
+            interpreter.environment = tmp
+        return complete(interpreter, completion, self, instance)
     
 
     def arity(self):
@@ -32,10 +95,32 @@ class LoxFunction(LoxCallable):
     
 
     def bind(self, instance):
-        environment = Environment(self.closure)
-        environment.values['this'] = instance
+        environment = Environment(self.closure, [instance])
         return LoxFunction(self.declaration, environment)
 
 
     def __str__(self):
         return f"<fn {self.declaration.name}>"
+
+
+class CompiledFunction(LoxFunction):
+    __slots__ = ('body',)
+
+    def __init__(self, declaration, closure, body):
+        super().__init__(declaration, closure)
+        self.body = body
+    
+
+    def call(self, interpreter, arguments):
+        completion = self.body(Environment(self.closure, arguments))
+        return complete(interpreter, completion, self, None)
+    
+
+    def invoke(self, interpreter, instance, arguments):
+        completion = self.body(Environment(Environment(self.closure, [instance]), arguments))
+        return complete(interpreter, completion, self, instance)
+    
+
+    def bind(self, instance):
+        environment = Environment(self.closure, [instance])
+        return CompiledFunction(self.declaration, environment, self.body)
@@ -1,26 +1,61 @@
+from Shape import EMPTY_SHAPE
+
 class LoxInstance:
+    __slots__ = ('klass', 'shape', 'values')
+
     def __init__(self, klass):
         self.klass = klass
-        self.fields = {}
+        self.shape = EMPTY_SHAPE
+        self.values = []
     
 
-    def get(self, name):
-        if name in self.fields:
-            return self.fields[name]
-        
-        method = self.klass.findMethod(name)
+    def getCached(self, cache):
+        shape = self.shape
+        if shape is cache.shape:
+            return self.values[cache.index]
+
+        index = shape.slots.get(cache.name)
+        if index != None:
+            cache.shape = shape
+            cache.index = index
+            return self.values[index]
+
+        method = cache.lookUp(self.klass)
 
         if method != None:
             return method.bind(self)
 
-        print(f"Undefined property {name}.")
+        print(f"Undefined property {cache.name}.")
         exit(1)
-    
 
-    def set(self, name, value):
-        self.fields[name] = value
+
+    def fieldIndex(self, cache):
+        shape = self.shape
+        if shape is cache.shape:
+            return cache.index
+
+        index = shape.slots.get(cache.name)
+        if index != None:
+            cache.shape = shape
+            cache.index = index
+        return index
+
+
+    def setCached(self, cache, value):
+        shape = self.shape
+        if shape is cache.shape:
+            self.values[cache.index] = value
+            return
+
+        index = shape.slots.get(cache.name)
+        if index != None:
+            cache.shape = shape
+            cache.index = index
+            self.values[index] = value
+        else:
+            self.shape = shape.withField(cache.name)
+            self.values.append(value)
 
 
     def __str__(self):
         return f"instance of {self.klass.name}"
-    
\ No newline at end of file
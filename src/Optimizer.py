@@ -0,0 +1,121 @@
+import sys
+from Stmt import *
+
+PASSES = ('fold', 'branches', 'unreachable', 'blocks')
+
+DESCRIPTIONS = {
+    'fold'        : "folded constant expressions",
+    'branches'    : "pruned constant branches",
+    'unreachable' : "removed unreachable statements",
+    'blocks'      : "unwrapped redundant blocks",
+}
+
+
+class Optimizer:
+    # Rewrites the AST between parsing and resolving. Every node has an
+    # optimize(optimizer) method returning its replacement, or None for a
+    # statement that can be dropped.
+    def __init__(self, statements: list[Stmt], passes=PASSES):
+        self.statements = statements
+        self.passes = set(passes)
+        self.changes = {name: 0 for name in PASSES}
+
+
+    def optimize(self) -> list[Stmt]:
+        return self.block(self.statements)
+
+
+    def enabled(self, name: str) -> bool:
+        return name in self.passes
+
+
+    def record(self, name: str, count: int = 1) -> None:
+        self.changes[name] += count
+
+
+    def report(self) -> None:
+        for name in PASSES:
+            if name in self.passes:
+                print(f"optimizer: {DESCRIPTIONS[name]}: {self.changes[name]}", file=sys.stderr)
+
+
+    def block(self, statements: list[Stmt]) -> list[Stmt]:
+        result = []
+        for index, statement in enumerate(statements):
+            statement = statement.optimize(self)
+            if statement == None:
+                continue
+
+            # A block that declares nothing adds a scope nobody uses.
+            if isinstance(statement, Block) and self.enabled('blocks') and not self.declares(statement):
+                result.extend(statement.statements)
+                self.record('blocks')
+            else:
+                result.append(statement)
+
+            if self.enabled('unreachable') and result and isinstance(result[-1], Return):
+                self.record('unreachable', len(statements) - index - 1)
+                break
+        return result
+
+
+    def branch(self, statement: Stmt) -> Stmt:
+        # The body of an if or while: a block that declares nothing is
+        # replaced by its statement if it holds one, and otherwise runs in
+        # the enclosing scope, as the body and increment of a for loop do.
+        statement = statement.optimize(self)
+        if statement == None:
+            return Block([])
+
+        if isinstance(statement, Block) and self.enabled('blocks') and not self.declares(statement):
+            if len(statement.statements) == 1:
+                self.record('blocks')
+                return statement.statements[0]
+            if statement.scoped:
+                statement.scoped = False
+                self.record('blocks')
+        return statement
+
+
+    def declares(self, block: Block) -> bool:
+        return any(isinstance(statement, (Var, Function, Class)) for statement in block.statements)
+
+
+    def fold(self, expr: Expr) -> Expr:
+        if not self.enabled('fold'):
+            return expr
+
+        operands = [expr.right] if isinstance(expr, UnaryExpr) else [expr.left, expr.right]
+        if not all(isinstance(operand, LiteralExpr) for operand in operands):
+            return expr
+
+        values = [operand.evaluate(None) for operand in operands]
+        if not self.foldable(expr.operator.type, values):
+            return expr
+
+        self.record('fold')
+        return LiteralExpr(expr.evaluate(None))
+
+
+    def foldable(self, operator: TokenType, values: list) -> bool:
+        # Only fold what is sure to evaluate the same way at run time, and
+        # leave anything that would fail to report its error there.
+        if operator in (TokenType.EQUAL_EQUAL, TokenType.BANG_EQUAL, TokenType.BANG):
+            return True
+        if operator == TokenType.PLUS:
+            return all(type(value) is float for value in values) or all(type(value) is str for value in values)
+        if not all(type(value) is float for value in values):
+            return False
+        if operator in (TokenType.SLASH, TokenType.MOD):
+            return values[1] != 0
+        return True
+
+
+    def logical(self, expr: Expr) -> Expr:
+        if not self.enabled('branches') or not isinstance(expr.left, LiteralExpr):
+            return expr
+
+        self.record('branches')
+        if bool(expr.left.evaluate(None)) == (expr.operator.type == TokenType.OR):
+            return expr.left
+        return expr.right
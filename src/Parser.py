@@ -1,11 +1,15 @@
 from Expr import *
 from Token import *
 from Stmt import *
+from CompactTokens import CompactTokens, TYPES
 
 class Parser:
+    # Tokens can come from any iterable, a list or Scanner.stream(); the
+    # parser only ever looks one token ahead.
     def __init__(self, tokens):
-        self.tokens = tokens
-        self.current = 0
+        self.tokens = iter(tokens)
+        self.last: Token = None
+        self.next: Token = next(self.tokens, None)
 
     
     def error(self, message):
@@ -14,21 +18,26 @@ class Parser:
 
 
     def reachEnd(self) -> bool:
-        return self.current >= len(self.tokens)
+        return self.next == None
 
     
-    def previous(self) -> str:
-        return self.tokens[self.current - 1]
+    def previous(self) -> Token:
+        return self.last
 
 
-    def advance(self) -> str:
-        if not self.reachEnd():
-            self.current += 1
-        return self.previous()
+    def advance(self) -> Token:
+        if self.next != None:
+            self.last = self.next
+            self.next = next(self.tokens, None)
+        return self.last
+
 
+    # Moves past the current token without handing it back.
+    skip = advance
 
-    def peek(self) -> str:
-        return self.tokens[self.current]
+
+    def peek(self) -> Token:
+        return self.next
 
 
     def check(self, type: TokenType) -> bool:
@@ -224,159 +233,217 @@ class Parser:
 
     def exprStmt(self) -> Stmt:
         expr = self.expression()
-        self.consume(TokenType.SEMICOLON, f"Expect ';' after expression. {expr}")
+        if not self.check(TokenType.SEMICOLON):
+            self.error(f"Expect ';' after expression. {expr}")
+        self.advance()
         return Expression(expr)
 
 
+    def peekType(self) -> TokenType:
+        if self.next == None:
+            return None
+        return self.next.type
+
+
+    # Expressions are parsed by precedence climbing: each token type maps to
+    # the method parsing an expression it starts (PREFIX_RULES), or one it
+    # continues, with its binding power (INFIX_RULES).
     def expression(self) -> Expr:
-        return self.assignment()
+        return self.parsePrecedence(PREC_ASSIGNMENT)
 
 
-    def assignment(self) -> Expr:
-        expr = self.lor()
+    def parsePrecedence(self, precedence: int) -> Expr:
+        expr = None
+        prefix = PREFIX_RULES.get(self.peekType())
+        if prefix != None:
+            self.skip()
+            expr = prefix(self)
 
-        if self.match(TokenType.EQUAL):
-            equals = self.previous()
-            value = self.assignment()
-
-            if isinstance(expr, VarExpr):
-                name = expr.name
-                return AssignExpr(name, value)
-            elif isinstance(expr, GetExpr):
-                return SetExpr(expr.obj, expr.name, value)
-            
-            print(equals, "Invalid assignment target")
-            exit(1)
+        while True:
+            rule = INFIX_RULES.get(self.peekType())
+            if rule == None or rule[1] < precedence:
+                return expr
+            self.skip()
+            expr = rule[0](self, expr)
+
+
+    def assignment(self, expr: Expr) -> Expr:
+        equals = self.previous()
+        value = self.parsePrecedence(PREC_ASSIGNMENT)
+
+        if isinstance(expr, VarExpr):
+            name = expr.name
+            return AssignExpr(name, value)
+        elif isinstance(expr, GetExpr):
+            return SetExpr(expr.obj, expr.name, value)
         
-        return expr
+        print(equals, "Invalid assignment target")
+        exit(1)
 
 
-    def lor(self) -> Expr:
-        expr = self.land()
+    def logical(self, left: Expr) -> Expr:
+        operator = self.previous()
+        right = self.parsePrecedence(INFIX_RULES[operator.type][1] + 1)
+        return LogicalExpr(left, operator, right)
 
-        while self.match(TokenType.OR):
-            operator = self.previous()
-            right = self.land()
-            expr = LogicalExpr(expr, operator, right)
-        
-        return expr
-    
 
-    def land(self) -> Expr:
-        expr = self.equality()
+    def binary(self, left: Expr) -> Expr:
+        operator = self.previous()
+        right = self.parsePrecedence(INFIX_RULES[operator.type][1] + 1)
+        return makeBinary(left, operator, right)
 
-        while self.match(TokenType.AND):
-            operator = self.previous()
-            right = self.equality()
-            expr = LogicalExpr(expr, operator, right)
-        
-        return expr
-    
 
-    def equality(self) -> Expr:
-        expr = self.comparison()
+    def unary(self) -> Expr:
+        operator = self.previous()
+        right = self.parsePrecedence(PREC_UNARY)
+        return UnaryExpr(operator, right)
 
-        while self.match(TokenType.BANG_EQUAL, TokenType.EQUAL_EQUAL):
-            operator = self.previous()
-            right = self.comparison()
-            expr = BinaryExpr(expr, operator, right)
-        
-        return expr
 
+    def dot(self, expr: Expr) -> Expr:
+        name = self.consume(TokenType.IDENTIFIER, "Expect property name after '.'.").data
+        return GetExpr(expr, name)
 
-    def comparison(self) -> Expr:
-        expr = self.term()
 
-        while self.match(TokenType.GREATER, TokenType.GREATER_EQUAL, TokenType.LESS, TokenType.LESS_EQUAL):
-            operator = self.previous()
-            right = self.term()
-            expr = BinaryExpr(expr, operator, right)
-        
-        return expr
+    def finishCall(self, callee: Expr) -> Expr:
+        arguments = []
+        if not self.check(TokenType.RIGHT_PAREN):
+            arguments.append(self.expression())
+            while self.match(TokenType.COMMA):
+                if len(arguments) >= 255:
+                    print("Can't have more than 255 arguments.")
+                arguments.append(self.expression())
 
+        paren = self.consume(TokenType.RIGHT_PAREN, "Expect ')' after arguments.")
 
-    def term(self) -> Expr:
-        expr = self.factor()
+        if isinstance(callee, GetExpr):
+            return InvokeExpr(callee.obj, callee.name, paren, arguments)
+        return CallExpr(callee, paren, arguments)
 
-        while self.match(TokenType.MINUS, TokenType.PLUS, TokenType.MOD):
-            operator = self.previous()
-            right = self.factor()
-            expr = BinaryExpr(expr, operator, right)
-        
-        return expr
 
+    def literal(self) -> Expr:
+        token = self.previous()
+        match token.type:
+            case TokenType.FALSE:
+                return LiteralExpr(False)
+            case TokenType.TRUE:
+                return LiteralExpr(True)
+            case TokenType.NIL:
+                return LiteralExpr(None)
+        return LiteralExpr(token.data)
 
-    def factor(self) -> Expr:
-        expr = self.unary()
 
-        while self.match(TokenType.SLASH, TokenType.STAR):
-            operator = self.previous()
-            right = self.unary()
-            expr = BinaryExpr(expr, operator, right)
-        
-        return expr
+    def variable(self) -> Expr:
+        return VarExpr(self.previous().data)
 
 
-    def unary(self) -> Expr:
-        if self.match(TokenType.BANG, TokenType.MINUS):
-            operator = self.previous()
-            right = self.unary()
-            return UnaryExpr(operator, right)
-        
-        return self.call()
+    def this(self) -> Expr:
+        return ThisExpr(self.previous())
 
 
-    def call(self) -> Expr:
-        expr = self.primary()
+    def superAccess(self) -> Expr:
+        keyword = self.previous()
+        self.consume(TokenType.DOT, "Expect '.' after 'super'.")
+        method = self.consume(TokenType.IDENTIFIER, "Expect superclass method name.")
+        return SuperExpr(keyword, method)
 
-        while True:
-            if self.match(TokenType.LEFT_PAREN):
-                expr = self.finishCall(expr)
-            elif self.match(TokenType.DOT):
-                name = self.consume(TokenType.IDENTIFIER, "Expect property name after '.'.").data
-                expr = GetExpr(expr, name)
-            else:
-                break
-        
-        return expr
 
+    def grouping(self) -> Expr:
+        expr = self.expression()
+        self.consume(TokenType.RIGHT_PAREN, "Expected ')' after expression")
+        return GroupingExpr(expr)
+
+
+PREC_ASSIGNMENT = 1
+PREC_OR         = 2
+PREC_AND        = 3
+PREC_EQUALITY   = 4
+PREC_COMPARISON = 5
+PREC_TERM       = 6
+PREC_FACTOR     = 7
+PREC_UNARY      = 8
+PREC_CALL       = 9
+
+PREFIX_RULES = {
+    TokenType.FALSE         : Parser.literal,
+    TokenType.TRUE          : Parser.literal,
+    TokenType.NIL           : Parser.literal,
+    TokenType.NUMBER        : Parser.literal,
+    TokenType.STRING        : Parser.literal,
+    TokenType.IDENTIFIER    : Parser.variable,
+    TokenType.THIS          : Parser.this,
+    TokenType.SUPER         : Parser.superAccess,
+    TokenType.LEFT_PAREN    : Parser.grouping,
+    TokenType.BANG          : Parser.unary,
+    TokenType.MINUS         : Parser.unary,
+}
+
+INFIX_RULES = {
+    TokenType.EQUAL         : (Parser.assignment, PREC_ASSIGNMENT),
+    TokenType.OR            : (Parser.logical, PREC_OR),
+    TokenType.AND           : (Parser.logical, PREC_AND),
+    TokenType.BANG_EQUAL    : (Parser.binary, PREC_EQUALITY),
+    TokenType.EQUAL_EQUAL   : (Parser.binary, PREC_EQUALITY),
+    TokenType.GREATER       : (Parser.binary, PREC_COMPARISON),
+    TokenType.GREATER_EQUAL : (Parser.binary, PREC_COMPARISON),
+    TokenType.LESS          : (Parser.binary, PREC_COMPARISON),
+    TokenType.LESS_EQUAL    : (Parser.binary, PREC_COMPARISON),
+    TokenType.MINUS         : (Parser.binary, PREC_TERM),
+    TokenType.PLUS          : (Parser.binary, PREC_TERM),
+    TokenType.MOD           : (Parser.binary, PREC_TERM),
+    TokenType.SLASH         : (Parser.binary, PREC_FACTOR),
+    TokenType.STAR          : (Parser.binary, PREC_FACTOR),
+    TokenType.LEFT_PAREN    : (Parser.finishCall, PREC_CALL),
+    TokenType.DOT           : (Parser.dot, PREC_CALL),
+}
+
+
+class CompactParser(Parser):
+    # Parses straight from a CompactTokens buffer. Checks compare type codes
+    # in place; a Token is only built for the tokens the parser takes.
+    def __init__(self, tokens: CompactTokens):
+        self.tokens = tokens
+        self.types = tokens.types
+        self.count = len(tokens)
+        self.current = 0
 
-    def finishCall(self, callee: Expr) -> Expr:
-        arguments = []
-        if not self.check(TokenType.RIGHT_PAREN):
-            arguments.append(self.expression())
-            while self.match(TokenType.COMMA):
-                if len(arguments) >= 255:
-                    print("Can't have more than 255 arguments.")
-                arguments.append(self.expression())
 
-        paren = self.consume(TokenType.RIGHT_PAREN, "Expect ')' after arguments.")
+    def reachEnd(self) -> bool:
+        return self.current >= self.count
 
-        return CallExpr(callee, paren, arguments)
 
+    def previous(self) -> Token:
+        return self.tokens.token(self.current - 1)
 
-    def primary(self) -> Expr:
-        if self.match(TokenType.FALSE):
-            return LiteralExpr(False)
-        if self.match(TokenType.TRUE):
-            return LiteralExpr(True)
-        if self.match(TokenType.NIL):
-            return LiteralExpr(None)
-        if self.match(TokenType.IDENTIFIER):
-            return VarExpr(self.previous().data)
-        if self.match(TokenType.THIS):
-            return ThisExpr(self.previous())
-        if self.match(TokenType.SUPER):
-            keyword = self.previous()
-            self.consume(TokenType.DOT, "Expect '.' after 'super'.")
-            method = self.consume(TokenType.IDENTIFIER, "Expect superclass method name.")
-            return SuperExpr(keyword, method)
-        
-        if self.match(TokenType.NUMBER, TokenType.STRING):
-            return LiteralExpr(self.previous().data)
-        
-        if self.match(TokenType.LEFT_PAREN):
-            expr = self.expression()
-            self.consume(TokenType.RIGHT_PAREN, "Expected ')' after expression")
-            return GroupingExpr(expr)
-    
\ No newline at end of file
+
+    def advance(self) -> Token:
+        if self.current < self.count:
+            self.current += 1
+        return self.previous()
+
+
+    def skip(self) -> None:
+        if self.current < self.count:
+            self.current += 1
+
+
+    def peek(self) -> Token:
+        return self.tokens.token(self.current)
+
+
+    def check(self, type: TokenType) -> bool:
+        return self.current < self.count and TYPES[self.types[self.current]] is type
+
+
+    def peekType(self) -> TokenType:
+        if self.current >= self.count:
+            return None
+        return TYPES[self.types[self.current]]
+
+
+    def match(self, *types: TokenType) -> bool:
+        if self.current < self.count:
+            current = TYPES[self.types[self.current]]
+            if current in types:
+                self.current += 1
+                return True
+        return False
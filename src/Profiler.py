@@ -0,0 +1,155 @@
+import sys
+import json
+import time
+from contextlib import contextmanager
+from LoxFunction import LoxFunction, CompiledFunction, TailCall
+from LoxClass import LoxClass
+
+SCRIPT = '<script>'
+
+
+def functionName(function, instance) -> str:
+    # A method is named after the class that declares it, found from the
+    # instance it runs on; a bound method keeps that instance in slot 0 of
+    # its closure.
+    declaration = function.declaration
+    if declaration.kind != 'method':
+        return declaration.name
+
+    if instance == None:
+        instance = function.closure.values[0]
+    klass = instance.klass
+    while klass != None:
+        method = klass.methods.get(declaration.name)
+        if method != None and method.declaration is declaration:
+            return f"{klass.name}.{declaration.name}"
+        klass = klass.superclass
+    return declaration.name
+
+
+@contextmanager
+def profiling(interpreter, profiler, sampler):
+    # Runs the profiler and the sampler, either of which may be None, for
+    # as long as the block takes.
+    if profiler != None:
+        profiler.start(interpreter)
+    if sampler != None:
+        sampler.start()
+    try:
+        yield
+    finally:
+        if sampler != None:
+            sampler.stop()
+        if profiler != None:
+            profiler.stop()
+
+
+class Profiler:
+    # Counts calls and measures wall time per Lox function, method, class and
+    # native. start() wraps the call and invoke methods of those callables
+    # for the length of a run and stop() puts the originals back, so a run
+    # without --profile pays nothing. Inclusive time counts a recursive
+    # function once, from its outermost call; exclusive time leaves out the
+    # calls it made. The top level of the script is reported as <script>.
+    def __init__(self, path: str = None):
+        self.path = path
+        self.stats: dict[str, list] = {}
+        self.active: dict[str, int] = {}
+        self.stack: list[list] = []
+        self.labels = {}
+        self.wrapped = []
+
+
+    def start(self, interpreter) -> None:
+        for klass in (LoxFunction, CompiledFunction):
+            self.wrap(klass, 'call', lambda function, arguments: self.functionLabel(function, None))
+            self.wrap(klass, 'invoke', lambda function, arguments: self.functionLabel(function, arguments[1]))
+        self.wrap(LoxClass, 'call', lambda klass, arguments: klass.name)
+        for name, native in interpreter.natives.items():
+            self.wrap(type(native), 'call', lambda native, arguments, name=name: name)
+        TailCall.profiler = self
+        self.enter(SCRIPT)
+
+
+    def stop(self) -> None:
+        while self.stack:
+            self.exit()
+        for klass, name, original in reversed(self.wrapped):
+            setattr(klass, name, original)
+        self.wrapped = []
+        TailCall.profiler = None
+
+
+    def wrap(self, klass, name: str, label) -> None:
+        original = klass.__dict__[name]
+        profiler = self
+
+        def profiled(callee, *arguments):
+            profiler.enter(label(callee, arguments))
+            try:
+                return original(callee, *arguments)
+            finally:
+                profiler.exit()
+
+        self.wrapped.append((klass, name, original))
+        setattr(klass, name, profiled)
+
+
+    def functionLabel(self, function, instance) -> str:
+        label = self.labels.get(function.declaration)
+        if label == None:
+            label = self.labels[function.declaration] = functionName(function, instance)
+        return label
+
+
+    def hop(self, function, instance) -> None:
+        # A tail call runs the callee in place of the function that made it,
+        # see TailCall.run, so the callee takes that function's place on the
+        # stack; the wrapped call that started the chain exits the last one.
+        self.exit()
+        self.enter(self.functionLabel(function, instance))
+
+
+    def enter(self, label: str) -> None:
+        self.active[label] = self.active.get(label, 0) + 1
+        self.stack.append([label, time.perf_counter(), 0.0])
+
+
+    def exit(self) -> None:
+        label, start, children = self.stack.pop()
+        elapsed = time.perf_counter() - start
+        if self.stack:
+            self.stack[-1][2] += elapsed
+
+        stats = self.stats.get(label)
+        if stats == None:
+            stats = self.stats[label] = [0, 0.0, 0.0]
+        stats[0] += 1
+        stats[2] += elapsed - children
+
+        self.active[label] -= 1
+        if self.active[label] == 0:
+            stats[1] += elapsed
+
+
+    def results(self) -> list[dict]:
+        results = [
+            {'name': label, 'calls': calls, 'inclusive': inclusive, 'exclusive': exclusive}
+            for label, (calls, inclusive, exclusive) in self.stats.items()
+        ]
+        results.sort(key=lambda result: result['exclusive'], reverse=True)
+        return results
+
+
+    def report(self) -> None:
+        results = self.results()
+        if self.path != None:
+            with open(self.path, 'w') as file:
+                json.dump(results, file, indent=4)
+                file.write('\n')
+            return
+
+        print(f"{'calls':>10} {'inclusive ms':>14} {'exclusive ms':>14}  name", file=sys.stderr)
+        for result in results:
+            print(f"{result['calls']:>10} {result['inclusive'] * 1000:14.2f} {result['exclusive'] * 1000:14.2f}  {result['name']}",
+                  file=sys.stderr)
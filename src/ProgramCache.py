@@ -0,0 +1,109 @@
+import os
+import sys
+import pickle
+import hashlib
+
+# Bump whenever the AST classes or what the resolver leaves on them change,
+# so programs cached by an older interpreter are not loaded.
+VERSION = 3
+
+SUFFIX = '.loxc'
+SIZE_LIMIT = 64 << 20
+
+
+def defaultDirectory() -> str:
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'pylox')
+
+
+class ProgramCache:
+    # Resolved programs pickled to <directory>/<key>.loxc. An entry is written
+    # to a temporary file and renamed into place, so a reader sees either the
+    # whole entry or none. Loading an entry touches it, and once the directory
+    # grows past sizeLimit the least recently used entries are removed.
+    # The cache must never stop a script from running: entries that can't be
+    # read are treated as missing and failed writes are ignored.
+    def __init__(self, directory: str = None, sizeLimit: int = SIZE_LIMIT):
+        self.directory = directory if directory != None else defaultDirectory()
+        self.sizeLimit = sizeLimit
+
+
+    def key(self, source: bytes, passes) -> str:
+        digest = hashlib.sha256(f"{VERSION}\n{sys.version}\n{sorted(passes)}\n".encode())
+        digest.update(source)
+        return digest.hexdigest()
+
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + SUFFIX)
+
+
+    def load(self, key: str):
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as file:
+                version, stored, program = pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            self.remove(path)
+            return None
+
+        if version != VERSION or stored != key:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return program
+
+
+    def store(self, key: str, program) -> None:
+        # Only a miss writes, so a hit never pays for importing tempfile.
+        import tempfile
+
+        try:
+            data = pickle.dumps((VERSION, key, program), pickle.HIGHEST_PROTOCOL)
+        except RecursionError:
+            return
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(descriptor, 'wb') as file:
+                    file.write(data)
+                os.replace(temporary, self.path(key))
+            except BaseException:
+                self.remove(temporary)
+                raise
+        except OSError:
+            return
+
+        self.evict()
+
+
+    def evict(self) -> None:
+        entries = []
+        try:
+            with os.scandir(self.directory) as scan:
+                for entry in scan:
+                    if entry.name.endswith(SUFFIX):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError:
+            return
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.sizeLimit:
+                break
+            self.remove(path)
+            total -= size
+
+
+    def remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
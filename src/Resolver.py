@@ -1,25 +1,38 @@
 from enum import Enum
 from Expr import Expr
 
+def nativeKey(name: str) -> str:
+    return f"<native {name}>"
+
+
 class Resolver:
     def __init__(self, interpreter):
         self.interpreter = interpreter
         self.scopes = []
-        self.scopes.append(dict())
+        self.slots = []
+        self.beginScope()
         self.currentFunction = 'None' 
+
+        # Natives take the first global slots but aren't declared, so a
+        # global of the same name can shadow them, see declare().
+        for slot, name in enumerate(interpreter.natives):
+            self.slots[0][name] = slot
     
 
     def resolve(self) -> None:
         for statement in self.interpreter.statements:
             statement.resolve(self)
+        self.interpreter.globalSlots = self.slots[0]
     
 
     def beginScope(self) -> None:
         self.scopes.append(dict())
+        self.slots.append(dict())
     
 
     def endScope(self) -> None:
         self.scopes.pop()
+        self.slots.pop()
     
 
     def declare(self, name: str) -> None:
@@ -31,6 +44,13 @@ class Resolver:
             print("Already a variable with same name in this scope.")
             exit(1)
         scope[name] = False
+        slots = self.slots[-1]
+        if name in slots:
+            # Only a native is in the slots without being declared. Its value
+            # stays in its slot, kept under a name no variable can have, and
+            # the new global gets one of its own.
+            slots[nativeKey(name)] = slots.pop(name)
+        slots[name] = len(slots)
     
 
     def define(self, name: str) -> None:
@@ -41,7 +61,12 @@ class Resolver:
     
 
     def resolveLocal(self, expr: Expr, name: str) -> None:
-        for i in range(len(self.scopes) - 1, -1, -1):
+        # The location is stored on the node itself. Globals keep depth None
+        # and are read straight from the global scope by slot, names that are
+        # not declared yet keep slot None too and are looked up by name.
+        for i in range(len(self.scopes) - 1, 0, -1):
             if name in self.scopes[i]:
-                self.interpreter.resolve(expr, len(self.scopes) - i - 1)
-                return
\ No newline at end of file
+                expr.depth = len(self.scopes) - i - 1
+                expr.slot = self.slots[i][name]
+                return
+        expr.slot = self.slots[0].get(name)
\ No newline at end of file
@@ -0,0 +1,111 @@
+import sys
+import threading
+from LoxFunction import LoxFunction, CompiledFunction, TailCall
+from LoxClass import LoxClass
+from Expr import CallExpr, FunctionCallExpr, ClassCallExpr, GenericCallExpr, InvokeExpr
+from Profiler import SCRIPT, functionName
+
+INTERVAL = 0.005
+
+FUNCTION_CODES = {
+    LoxFunction.call.__code__, LoxFunction.invoke.__code__,
+    CompiledFunction.call.__code__, CompiledFunction.invoke.__code__,
+}
+
+CLASS_CODES = {LoxClass.call.__code__}
+
+TAIL_CODE = TailCall.run.__code__
+
+SITE_CODES = {
+    method.__code__
+    for klass in (CallExpr, FunctionCallExpr, ClassCallExpr, GenericCallExpr, InvokeExpr)
+    for name, method in vars(klass).items() if name in ('evaluate', 'call')
+}
+
+
+class Sampler:
+    # Samples the Lox call stack from a timer thread and counts each distinct
+    # stack, written out as collapsed stacks ("<script>;outer:3;inner:7 12")
+    # that flamegraph tools read. The stack isn't kept up by the interpreter:
+    # every Lox call runs in a call or invoke frame of a callable, so the
+    # sampler reads it off the Python frames of the interpreting thread, and
+    # a run pays only for the samples. A function is followed by the line of
+    # the call that entered it, which the closure backend doesn't keep.
+    def __init__(self, path: str = None, interval: float = INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.counts: dict[str, int] = {}
+        self.labels = {}
+        self.thread: int = None
+        self.stopped = threading.Event()
+        self.timer: threading.Thread = None
+
+
+    def start(self) -> None:
+        self.thread = threading.get_ident()
+        self.stopped.clear()
+        self.timer = threading.Thread(target=self.run, daemon=True)
+        self.timer.start()
+
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.timer.join()
+
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread)
+            if frame != None:
+                self.sample(frame)
+
+
+    def sample(self, frame) -> None:
+        # Frames are walked from the innermost out, so a call site is met
+        # right after the call it made. A chain of tail calls runs in the
+        # frame of the call that started it, which stands for the function
+        # running at the end of the chain; that function wasn't called from
+        # the site of the call, so it gets no line.
+        names = []
+        entered = False
+        tail = False
+        while frame != None:
+            code = frame.f_code
+            if code is TAIL_CODE:
+                call = frame.f_locals.get('call') or frame.f_locals['self']
+                names.append(self.functionLabel(call.function, call.instance))
+                tail = True
+            elif code in FUNCTION_CODES:
+                if tail:
+                    tail = False
+                else:
+                    locals = frame.f_locals
+                    names.append(self.functionLabel(locals['self'], locals.get('instance')))
+                    entered = True
+            elif code in CLASS_CODES:
+                names.append(frame.f_locals['self'].name)
+                entered = True
+            elif entered and code in SITE_CODES:
+                names[-1] += f":{frame.f_locals['self'].paren.line}"
+                entered = False
+            frame = frame.f_back
+
+        names.append(SCRIPT)
+        stack = ';'.join(reversed(names))
+        self.counts[stack] = self.counts.get(stack, 0) + 1
+
+
+    def functionLabel(self, function, instance) -> str:
+        label = self.labels.get(function.declaration)
+        if label == None:
+            label = self.labels[function.declaration] = functionName(function, instance)
+        return label
+
+
+    def report(self) -> None:
+        lines = [f"{stack} {count}\n" for stack, count in sorted(self.counts.items())]
+        if self.path == None:
+            sys.stderr.writelines(lines)
+            return
+        with open(self.path, 'w') as file:
+            file.writelines(lines)
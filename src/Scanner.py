@@ -1,189 +1,206 @@
+import re
 import sys
+import codecs
 from Token import *
+from CompactTokens import CompactTokens, CODES
+
+KEYWORDS = {
+    "and"       : TokenType.AND,
+    "class"     : TokenType.CLASS,
+    "else"      : TokenType.ELSE,
+    "false"     : TokenType.FALSE,
+    "if"        : TokenType.IF,
+    "for"       : TokenType.FOR,
+    "fun"       : TokenType.FUN,
+    "nil"       : TokenType.NIL,
+    "or"        : TokenType.OR,
+    "print"     : TokenType.PRINT,
+    "return"    : TokenType.RETURN,
+    "super"     : TokenType.SUPER,
+    "this"      : TokenType.THIS,
+    "true"      : TokenType.TRUE,
+    "var"       : TokenType.VAR,
+    "while"     : TokenType.WHILE
+}
+
+OPERATORS = {
+    '('  : TokenType.LEFT_PAREN,
+    ')'  : TokenType.RIGHT_PAREN,
+    '{'  : TokenType.LEFT_BRACE,
+    '}'  : TokenType.RIGHT_BRACE,
+    ','  : TokenType.COMMA,
+    '.'  : TokenType.DOT,
+    '-'  : TokenType.MINUS,
+    '+'  : TokenType.PLUS,
+    ';'  : TokenType.SEMICOLON,
+    '*'  : TokenType.STAR,
+    '%'  : TokenType.MOD,
+    '/'  : TokenType.SLASH,
+    '!'  : TokenType.BANG,
+    '!=' : TokenType.BANG_EQUAL,
+    '='  : TokenType.EQUAL,
+    '==' : TokenType.EQUAL_EQUAL,
+    '<'  : TokenType.LESS,
+    '<=' : TokenType.LESS_EQUAL,
+    '>'  : TokenType.GREATER,
+    '>=' : TokenType.GREATER_EQUAL,
+}
+
+# One alternative per kind of lexeme, tried in order at each position, with
+# the blanks before a lexeme folded into its match. Any other character starts
+# an identifier, as it always has.
+TOKEN_PATTERN = re.compile(r'''
+    [ \t\r]*
+    (?:
+        (?P<IDENTIFIER>[^\W\d]\w*)
+      | (?P<OPERATOR>[!=<>]=?|[(){},.\-+;*%]|/(?!/))
+      | (?P<NEWLINE>\n[ \t\r\n]*)
+      | (?P<NUMBER>\d+\.\d+|\d+(?![\d.]))
+      | (?P<COMMENT>//[^\n]*)
+      | (?P<DECIMAL>\d+\.)
+      | (?P<STRING>"[^"]*")
+      | (?P<UNTERMINATED>"[^"]*)
+      | (?P<OTHER>[^ \t\r]\w*)
+    )
+''', re.VERBOSE | re.DOTALL)
+
+
+CHUNK_SIZE = 1 << 16
+
 
 class Scanner:
-    def __init__(self, source: str):
-        self.source: str = source
+    # The source is either the program text or a file-like object (an open
+    # file, an mmap) read in chunks, so tokens can be consumed while the rest
+    # of the input has not been read yet.
+    def __init__(self, source):
+        self.source = source
         self.tokens: list[Token] = []
-        self.start: int = 0
-        self.current: int = 0
         self.line: int = 1
-        self.keywords = {
-            "and"       : TokenType.AND,
-            "class"     : TokenType.CLASS,
-            "else"      : TokenType.ELSE,
-            "false"     : TokenType.FALSE,
-            "if"        : TokenType.IF,
-            "for"       : TokenType.FOR,
-            "fun"       : TokenType.FUN,
-            "nil"       : TokenType.NIL,
-            "or"        : TokenType.OR,
-            "print"     : TokenType.PRINT,
-            "return"    : TokenType.RETURN,
-            "super"     : TokenType.SUPER,
-            "this"      : TokenType.THIS,
-            "true"      : TokenType.TRUE,
-            "var"       : TokenType.VAR,
-            "while"     : TokenType.WHILE
-        }
-
-
-    def reachEnd(self) -> bool:
-        return self.current >= len(self.source)
-
-
-    def advance(self) -> str:
-        if self.reachEnd():
-            return '\0'
-        c = self.source[self.current] 
-        self.current += 1
-        return c
-
-
-    def peek(self) -> str:
-        if self.reachEnd():
-            return '\0'
-        return self.source[self.current]
-
-    
-    def peekNext(self) -> str:
-        if self.current + 1 >= len(self.source):
-            return '\0'
-        return self.source[self.current+1]
-
-
-    def match(self, expected: str) -> bool:
-        if self.peek() != expected:
-            return False
-        self.current += 1
-        return True 
-
-    
-    def isValidIdentifierChar(self, c: str) -> bool:
-        return c.isalpha() or c.isdigit() or c == '_'
-
-    
-    def addToken(self, type: TokenType, data: any = None) -> None:
-        self.tokens.append(Token(type, data, self.line))
 
 
     def scan(self):
-        while not self.reachEnd():
-            self.start = self.current
-            self.scanToken()
-
-        # self.addToken(TokenType.EOF)
-
-        return self.tokens;
-    
-
-    def scanToken(self):
-        c = self.advance()
-        match c:
-            case '(':
-                self.addToken(TokenType.LEFT_PAREN)
-            case ')':
-                self.addToken(TokenType.RIGHT_PAREN)
-            case '{':
-                self.addToken(TokenType.LEFT_BRACE)
-            case '}':
-                self.addToken(TokenType.RIGHT_BRACE)
-            case ',':
-                self.addToken(TokenType.COMMA)
-            case '.':
-                self.addToken(TokenType.DOT)
-            case '-':
-                self.addToken(TokenType.MINUS)
-            case '+':
-                self.addToken(TokenType.PLUS)
-            case ';':
-                self.addToken(TokenType.SEMICOLON)
-            case '*':
-                self.addToken(TokenType.STAR)
-            case '%':
-                self.addToken(TokenType.MOD)
-            case '!':
-                if self.match('='):
-                    self.addToken(TokenType.BANG_EQUAL)
-                else:
-                    self.addToken(TokenType.BANG)
-            case '=':
-                if self.match('='):
-                    self.addToken(TokenType.EQUAL_EQUAL)
-                else:
-                    self.addToken(TokenType.EQUAL)
-            case '<':
-                if self.match('='):
-                    self.addToken(TokenType.LESS_EQUAL)
-                else:
-                    self.addToken(TokenType.LESS)
-            case '>':
-                if self.match('='):
-                    self.addToken(TokenType.GREATER_EQUAL)
+        self.tokens.extend(self.stream())
+        return self.tokens
+
+
+    def scanCompact(self) -> CompactTokens:
+        source = self.source if isinstance(self.source, str) else ''.join(self.chunks())
+        tokens = CompactTokens(source)
+        append = tokens.append
+        keywords = {name: CODES[type] for name, type in KEYWORDS.items()}
+        operators = {text: CODES[type] for text, type in OPERATORS.items()}
+        identifier = CODES[TokenType.IDENTIFIER]
+        number = CODES[TokenType.NUMBER]
+        string = CODES[TokenType.STRING]
+        line = self.line
+
+        for match in TOKEN_PATTERN.finditer(source):
+            kind = match.lastgroup
+            start, end = match.span(kind)
+
+            if kind == 'IDENTIFIER':
+                append(keywords.get(source[start:end], identifier), start, end, line)
+            elif kind == 'NEWLINE':
+                line += source.count('\n', start, end)
+            elif kind == 'OPERATOR':
+                append(operators[source[start:end]], start, end, line)
+            elif kind == 'NUMBER':
+                append(number, start, end, line)
+            elif kind == 'STRING':
+                line += source.count('\n', start, end)
+                append(string, start, end, line)
+            elif kind == 'DECIMAL':
+                print("Unexpected decimal point")
+                exit(1)
+            elif kind == 'UNTERMINATED':
+                line += source.count('\n', start, end)
+                if end - start == 1:
+                    append(string, start, end, line)
                 else:
-                    self.addToken(TokenType.GREATER)
-            case '/':
-                if self.match('/'):
-                    while self.peek() != '\n' and not self.reachEnd():
-                        self.advance()
+                    print("Untermenated string on line ", line)
+                    sys.exit(1)
+            elif kind == 'OTHER':
+                append(identifier, start, end, line)
+
+        self.line = line
+        return tokens
+
+
+    def chunks(self):
+        if isinstance(self.source, str):
+            for start in range(0, len(self.source), CHUNK_SIZE):
+                yield self.source[start:start + CHUNK_SIZE]
+            return
+
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        while True:
+            data = self.source.read(CHUNK_SIZE)
+            if not data:
+                break
+            yield decoder.decode(data) if isinstance(data, bytes) else data
+        rest = decoder.decode(b'', True)
+        if rest:
+            yield rest
+
+
+    def stream(self):
+        # A lexeme that runs into the end of the text read so far may go on
+        # in the next chunk, so it is left for the next round.
+        chunks = self.chunks()
+        buffer = ''
+        chunk = next(chunks, None)
+        while chunk != None:
+            following = next(chunks, None)
+            buffer += chunk
+
+            tokens = []
+            end = self.scanText(buffer, following == None, tokens.append)
+            yield from tokens
+
+            buffer = buffer[end:]
+            chunk = following
+
+
+    def scanText(self, buffer: str, final: bool, append) -> int:
+        line = self.line
+        end = 0
+        size = len(buffer)
+
+        for match in TOKEN_PATTERN.finditer(buffer):
+            if not final and match.end() == size:
+                break
+            end = match.end()
+            kind = match.lastgroup
+            text = match.group(kind)
+
+            if kind == 'IDENTIFIER':
+                type = KEYWORDS.get(text)
+                if type != None:
+                    append(Token(type, None, line))
                 else:
-                    self.addToken(TokenType.SLASH)
-            case ' ':
-                pass
-            case '\r':
-                pass
-            case '\t':
-                pass
-            case '\n':
-                self.line += 1
-            case '"':
-                self.scanString()
-            case _:
-                if c.isdigit():
-                    self.scanNumber()
-                elif c.isalpha or c == '_':
-                    self.scanIdentifier()
+                    append(Token(TokenType.IDENTIFIER, text, line))
+            elif kind == 'NEWLINE':
+                line += text.count('\n')
+            elif kind == 'OPERATOR':
+                append(Token(OPERATORS[text], None, line))
+            elif kind == 'NUMBER':
+                append(Token(TokenType.NUMBER, float(text), line))
+            elif kind == 'STRING':
+                # A string token carries the line it ends on.
+                line += text.count('\n')
+                append(Token(TokenType.STRING, text[1:-1], line))
+            elif kind == 'DECIMAL':
+                print("Unexpected decimal point")
+                exit(1)
+            elif kind == 'UNTERMINATED':
+                line += text.count('\n')
+                if len(text) == 1:
+                    append(Token(TokenType.STRING, '', line))
                 else:
-                    print("Unexpected token")
+                    print("Untermenated string on line ", line)
                     sys.exit(1)
+            elif kind == 'OTHER':
+                append(Token(TokenType.IDENTIFIER, text, line))
 
-
-    def scanNumber(self) -> None:
-        while self.peek().isdigit():
-            self.advance()
-        if self.peek() == '.':
-            if self.peekNext().isdigit():
-                self.advance()
-            else:
-                print("Unexpected decimal point")
-                exit(1)
-            
-            while self.peek().isdigit():
-                self.advance()
-        self.addToken(TokenType.NUMBER, float(self.source[self.start:self.current]))
-
-
-    def scanString(self) -> None:
-        while self.peek() != '"' and not self.reachEnd():
-            if self.peek() == '\n':
-                self.line += 1
-            self.advance()
-
-            if self.reachEnd():
-                print("Untermenated string on line ", self.line)
-                sys.exit(1)
-            
-        data = self.source[self.start+1:self.current]
-        self.addToken(TokenType.STRING, data)
-        self.advance()
-
-        
-    def scanIdentifier(self) -> None:
-        while self.isValidIdentifierChar(self.peek()):
-            self.advance()
-        identifier = self.source[self.start:self.current]
-        type = self.keywords.get(identifier, None)
-        if type != None:
-            self.addToken(type)
-        else:
-            self.addToken(TokenType.IDENTIFIER, identifier)
+        self.line = line
+        return end
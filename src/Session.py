@@ -0,0 +1,96 @@
+import io
+import sys
+from Scanner import Scanner
+from Parser import Parser
+from Interpreter import Interpreter
+from Resolver import Resolver, nativeKey
+from Optimizer import Optimizer, PASSES
+
+
+class Session:
+    # Keeps one interpreter, resolver and backend state alive across inputs,
+    # so every input only scans, parses, resolves and runs its own
+    # statements, while the globals it declares stay visible to later ones.
+    # Errors are still reported by printing and exiting; run() catches the
+    # exit and takes back whatever the failed input declared. The profiler
+    # and sampler, if given, run while each input does and keep counting
+    # across inputs.
+    def __init__(self, backend: str = 'tree', passes=PASSES, profiler=None, sampler=None):
+        self.backend = backend
+        self.passes = passes
+        self.profiler = profiler
+        self.sampler = sampler
+        self.interpreter = Interpreter([], backend == 'closure')
+        self.resolver = Resolver(self.interpreter)
+        self.vm = None
+        self.namespace = None
+        if backend == 'vm':
+            from VM import VM
+            self.vm = VM()
+        elif backend == 'python':
+            from Transpiler import Transpiler
+            self.namespace = Transpiler.namespace()
+
+
+    def run(self, source) -> bool:
+        declared = len(self.resolver.slots[0])
+        # exit() closes sys.stdin before raising SystemExit, and the prompt
+        # still reads from it, so the input runs with a stand-in.
+        stdin = sys.stdin
+        sys.stdin = io.StringIO()
+        try:
+            self.execute(source)
+        except SystemExit:
+            self.rollBack(declared)
+            return False
+        finally:
+            sys.stdin = stdin
+        return True
+
+
+    def execute(self, source) -> None:
+        statements = Parser(Scanner(source).stream()).parse()
+        statements = Optimizer(statements, self.passes).optimize()
+
+        interpreter = self.interpreter
+        interpreter.statements = statements
+        self.resolver.resolve()
+
+        if self.backend == 'vm':
+            from Compiler import Compiler
+            self.vm.interpret(Compiler().compile(statements))
+        elif self.backend == 'python':
+            from Transpiler import Transpiler
+            Transpiler.execute(compile(Transpiler().transpile(statements), "<lox>", "exec"), self.namespace)
+        elif self.profiler == None and self.sampler == None:
+            interpreter.interpret()
+        else:
+            from Profiler import profiling
+            with profiling(interpreter, self.profiler, self.sampler):
+                interpreter.interpret()
+
+
+    def rollBack(self, declared: int) -> None:
+        resolver = self.resolver
+        del resolver.scopes[1:]
+        del resolver.slots[1:]
+        resolver.currentFunction = 'None'
+
+        # The tree and closure backends define globals in slot order, so the
+        # names that got a value are the ones below the number of values.
+        # The others look globals up by name and can declare them again.
+        if self.backend in ('tree', 'closure'):
+            declared = len(self.interpreter.globals.values)
+        for name, slot in list(resolver.slots[0].items()):
+            if slot >= declared:
+                del resolver.slots[0][name]
+                del resolver.scopes[0][name]
+                native = resolver.slots[0].pop(nativeKey(name), None)
+                if native != None:
+                    resolver.slots[0][name] = native
+
+        self.interpreter.environment = self.interpreter.globals
+        if self.vm != None:
+            del self.vm.stack[:]
+            del self.vm.frames[:]
+            self.vm.openUpvalues = []
@@ -0,0 +1,22 @@
+class Shape:
+    __slots__ = ('slots', 'transitions')
+
+    # Describes the layout of an instance's fields: which index in its value
+    # list each field lives at. Instances that gain the same fields in the same
+    # order follow the same transitions and end up sharing one Shape.
+    def __init__(self, slots: dict):
+        self.slots = slots
+        self.transitions: dict = {}
+
+
+    def withField(self, name: str):
+        shape = self.transitions.get(name)
+        if shape == None:
+            slots = dict(self.slots)
+            slots[name] = len(slots)
+            shape = Shape(slots)
+            self.transitions[name] = shape
+        return shape
+
+
+EMPTY_SHAPE = Shape({})
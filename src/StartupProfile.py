@@ -0,0 +1,29 @@
+import sys
+import time
+
+PHASES = ('import', 'cache', 'scan', 'parse', 'optimize', 'resolve', 'compile', 'execute')
+
+
+class StartupProfile:
+    # Wall time per phase of a run, starting from the moment Lox.py began
+    # importing. Each enter(phase) closes the phase running until then, so
+    # the phases add up to the whole run even when it ends in an error.
+    def __init__(self, started: float):
+        self.times = dict.fromkeys(PHASES, 0.0)
+        self.phase = 'import'
+        self.last = started
+
+
+    def enter(self, phase: str) -> None:
+        now = time.perf_counter()
+        self.times[self.phase] += now - self.last
+        self.phase = phase
+        self.last = now
+
+
+    def report(self) -> None:
+        self.enter(self.phase)
+        total = sum(self.times.values())
+        for phase in PHASES:
+            print(f"startup: {phase:<8} {self.times[phase] * 1000:8.2f} ms", file=sys.stderr)
+        print(f"startup: {'total':<8} {total * 1000:8.2f} ms", file=sys.stderr)
@@ -1,11 +1,13 @@
 from abc import ABC, abstractmethod
 from Expr import *
-from LoxFunction import LoxFunction 
-from ReturnException import ReturnException
+from LoxFunction import LoxFunction, CompiledFunction
+from Completion import RETURN
 from Resolver import Resolver
 from LoxClass import LoxClass
 
 class Stmt:
+    __slots__ = ()
+
     @abstractmethod
     def execute(self, interpreter):
         pass
@@ -16,7 +18,29 @@ class Stmt:
         pass
 
 
+    @abstractmethod
+    def compile(self, compiler):
+        pass
+
+
+    @abstractmethod
+    def toClosure(self, interpreter):
+        pass
+
+
+    @abstractmethod
+    def transpile(self, transpiler):
+        pass
+
+
+    @abstractmethod
+    def optimize(self, optimizer):
+        pass
+
+
 class Expression(Stmt):
+    __slots__ = ('expression',)
+
     def __init__(self, expression):
         self.expression: Expr = expression
 
@@ -29,11 +53,41 @@ class Expression(Stmt):
         self.expression.resolve(resolver)
 
 
+    def compile(self, compiler):
+        self.expression.compile(compiler)
+        compiler.emit(OP_POP)
+
+
+    def toClosure(self, interpreter):
+        return self.expression.toClosure(interpreter)
+
+
+    def transpile(self, transpiler):
+        expression = self.expression
+
+        # Assignments in statement position become plain Python assignments.
+        if isinstance(expression, AssignExpr) and transpiler.declared(expression.name):
+            value = expression.expression.transpile(transpiler)
+            transpiler.emit(f"{transpiler.store(expression.name)} = {value}")
+        elif isinstance(expression, SetExpr) and isinstance(expression.obj, ThisExpr):
+            obj = expression.obj.transpile(transpiler)
+            transpiler.emit(f"{obj}.{transpiler.attribute(expression.name)} = {expression.value.transpile(transpiler)}")
+        else:
+            transpiler.emit(expression.transpile(transpiler))
+
+
+    def optimize(self, optimizer):
+        self.expression = self.expression.optimize(optimizer)
+        return self
+
+
     def __str__(self):
         return f'expr {self.expression}'
 
 
 class Print(Stmt):
+    __slots__ = ('expression',)
+
     def __init__(self, expression):
         self.expression: Expr = expression
 
@@ -46,18 +100,42 @@ class Print(Stmt):
         self.expression.resolve(resolver)
 
     
+    def compile(self, compiler):
+        self.expression.compile(compiler)
+        compiler.emit(OP_PRINT)
+
+
+    def toClosure(self, interpreter):
+        expression = self.expression.toClosure(interpreter)
+        return lambda environment: print(expression(environment))
+
+
+    def transpile(self, transpiler):
+        transpiler.emit(f"_print({self.expression.transpile(transpiler)})")
+
+
+    def optimize(self, optimizer):
+        self.expression = self.expression.optimize(optimizer)
+        return self
+
+
     def __str__(self):
         return f'print {self.expression}'
 
 
 class Var(Stmt):
+    __slots__ = ('name', 'expression')
+
     def __init__(self, name, expression):
         self.name = name
         self.expression = expression
 
     
     def execute(self, interpreter):
-        interpreter.environment.values[self.name] = self.expression.evaluate(interpreter) 
+        value = "nil"
+        if self.expression != None:
+            value = self.expression.evaluate(interpreter)
+        interpreter.environment.values.append(value)
     
 
     def resolve(self, resolver):
@@ -67,31 +145,125 @@ class Var(Stmt):
         resolver.define(self.name)
 
     
+    def compile(self, compiler):
+        compiler.declareVariable(self.name)
+        if self.expression:
+            self.expression.compile(compiler)
+        else:
+            compiler.emit(OP_NIL)
+        compiler.defineVariable(self.name)
+
+
+    def toClosure(self, interpreter):
+        if self.expression == None:
+            return lambda environment: environment.values.append("nil")
+
+        expression = self.expression.toClosure(interpreter)
+        return lambda environment: environment.values.append(expression(environment))
+
+
+    def transpile(self, transpiler):
+        value = self.expression.transpile(transpiler) if self.expression else "'nil'"
+        transpiler.emit(f"{transpiler.declare(self.name)} = {value}")
+
+
+    def optimize(self, optimizer):
+        if self.expression:
+            self.expression = self.expression.optimize(optimizer)
+        return self
+
+
     def __str__(self):
         return f'(dec {self.name} = {self.expression})'
 
 
 class Block(Stmt):
-    def __init__(self, statements):
+    __slots__ = ('statements', 'scoped')
+
+    # A block that isn't scoped runs its statements in the enclosing scope;
+    # the optimizer leaves only blocks that declare nothing unscoped.
+    def __init__(self, statements, scoped: bool = True):
         self.statements = statements
+        self.scoped = scoped
     
     def execute(self, interpreter):
+        if not self.scoped:
+            for statement in self.statements:
+                if statement.execute(interpreter) is RETURN:
+                    return RETURN
+            return
+
         previous = interpreter.environment
         interpreter.environment = Environment(previous)
         
         for statement in self.statements:
-            statement.execute(interpreter)
+            if statement.execute(interpreter) is RETURN:
+                interpreter.environment = previous
+                return RETURN
         
         interpreter.environment = previous
     
 
     def resolve(self, resolver):
+        if not self.scoped:
+            for statement in self.statements:
+                statement.resolve(resolver)
+            return
+
         resolver.beginScope()
         for statement in self.statements:
             statement.resolve(resolver)
         resolver.endScope()
 
     
+    def compile(self, compiler):
+        if self.scoped:
+            compiler.beginScope()
+        for statement in self.statements:
+            statement.compile(compiler)
+        if self.scoped:
+            compiler.endScope()
+
+
+    def toClosure(self, interpreter):
+        statements = [statement.toClosure(interpreter) for statement in self.statements]
+
+        if not self.scoped:
+            def sequence(environment):
+                for statement in statements:
+                    if statement(environment) is RETURN:
+                        return RETURN
+            return sequence
+
+        def block(environment):
+            environment = Environment(environment)
+            for statement in statements:
+                if statement(environment) is RETURN:
+                    return RETURN
+        return block
+
+
+    def transpile(self, transpiler):
+        if not self.scoped:
+            for statement in self.statements:
+                statement.transpile(transpiler)
+            return
+
+        if transpiler.needsFrame(self):
+            transpiler.frame(self)
+            return
+
+        transpiler.beginScope()
+        for statement in self.statements:
+            statement.transpile(transpiler)
+        transpiler.endScope()
+
+
+    def optimize(self, optimizer):
+        self.statements = optimizer.block(self.statements)
+        return self
+
+
     def __str__(self):
         string = "\n"
         for statement in self.statements:
@@ -100,6 +272,8 @@ class Block(Stmt):
 
 
 class If(Stmt):
+    __slots__ = ('condition', 'ifBranch', 'elseBranch')
+
     def __init__(self, condition, ifBranch, elseBranch):
         self.condition: Expr = condition
         self.ifBranch: Stmt = ifBranch
@@ -108,9 +282,9 @@ class If(Stmt):
 
     def execute(self, interpreter):
         if self.condition.evaluate(interpreter):
-            self.ifBranch.execute(interpreter)
+            return self.ifBranch.execute(interpreter)
         elif self.elseBranch:
-            self.elseBranch.execute(interpreter)
+            return self.elseBranch.execute(interpreter)
 
 
     def resolve(self, resolver):
@@ -120,6 +294,61 @@ class If(Stmt):
             self.elseBranch.resolve(resolver)
 
 
+    def compile(self, compiler):
+        self.condition.compile(compiler)
+
+        thenJump = compiler.emitJump(OP_JUMP_IF_FALSE)
+        compiler.emit(OP_POP)
+        self.ifBranch.compile(compiler)
+
+        elseJump = compiler.emitJump(OP_JUMP)
+        compiler.patchJump(thenJump)
+        compiler.emit(OP_POP)
+        if self.elseBranch:
+            self.elseBranch.compile(compiler)
+        compiler.patchJump(elseJump)
+
+
+    def toClosure(self, interpreter):
+        condition = self.condition.toClosure(interpreter)
+        ifBranch = self.ifBranch.toClosure(interpreter)
+
+        if self.elseBranch == None:
+            def branch(environment):
+                if condition(environment):
+                    return ifBranch(environment)
+            return branch
+
+        elseBranch = self.elseBranch.toClosure(interpreter)
+        def branch(environment):
+            if condition(environment):
+                return ifBranch(environment)
+            return elseBranch(environment)
+        return branch
+
+
+    def transpile(self, transpiler):
+        transpiler.emit(f"if {self.condition.transpile(transpiler)}:")
+        transpiler.suite(self.ifBranch)
+        if self.elseBranch:
+            transpiler.emit("else:")
+            transpiler.suite(self.elseBranch)
+
+
+    def optimize(self, optimizer):
+        self.condition = self.condition.optimize(optimizer)
+        self.ifBranch = optimizer.branch(self.ifBranch)
+        if self.elseBranch:
+            self.elseBranch = optimizer.branch(self.elseBranch)
+
+        if optimizer.enabled('branches') and isinstance(self.condition, LiteralExpr):
+            optimizer.record('branches')
+            if self.condition.evaluate(None):
+                return self.ifBranch
+            return self.elseBranch
+        return self
+
+
     def __str__(self):
         string = f'if {self.condition} {self.ifBranch}'
         if self.elseBranch != None:
@@ -128,6 +357,8 @@ class If(Stmt):
     
 
 class While(Stmt):
+    __slots__ = ('condition', 'body')
+
     def __init__(self, condition, body):
         self.condition = condition
         self.body = body
@@ -135,7 +366,8 @@ class While(Stmt):
     
     def execute(self, interpreter):
         while (self.condition.evaluate(interpreter)):
-            self.body.execute(interpreter)
+            if self.body.execute(interpreter) is RETURN:
+                return RETURN
     
     
     def resolve(self, resolver):
@@ -143,11 +375,55 @@ class While(Stmt):
         self.body.resolve(resolver)
     
 
+    def compile(self, compiler):
+        loopStart = len(compiler.state.proto.code)
+        self.condition.compile(compiler)
+
+        exitJump = compiler.emitJump(OP_JUMP_IF_FALSE)
+        compiler.emit(OP_POP)
+        self.body.compile(compiler)
+        compiler.emitLoop(loopStart)
+
+        compiler.patchJump(exitJump)
+        compiler.emit(OP_POP)
+
+
+    def toClosure(self, interpreter):
+        condition = self.condition.toClosure(interpreter)
+        body = self.body.toClosure(interpreter)
+
+        def loop(environment):
+            while condition(environment):
+                if body(environment) is RETURN:
+                    return RETURN
+        return loop
+
+
+    def transpile(self, transpiler):
+        transpiler.emit(f"while {self.condition.transpile(transpiler)}:")
+        transpiler.scope.loopDepth += 1
+        transpiler.suite(self.body)
+        transpiler.scope.loopDepth -= 1
+
+
+    def optimize(self, optimizer):
+        self.condition = self.condition.optimize(optimizer)
+        self.body = optimizer.branch(self.body)
+
+        if optimizer.enabled('branches') and isinstance(self.condition, LiteralExpr):
+            if not self.condition.evaluate(None):
+                optimizer.record('branches')
+                return None
+        return self
+
+
     def __str__(self):
         return f'while {self.condition}\n{self.body}'
 
 
 class Function(Stmt):
+    __slots__ = ('name', 'parameters', 'body', 'kind')
+
     def __init__(self, name, parameters, body, kind):
         self.name = name
         self.parameters = parameters
@@ -156,7 +432,7 @@ class Function(Stmt):
     
 
     def execute(self, interpreter):
-        interpreter.environment.values[self.name] = LoxFunction(self, interpreter.environment)
+        interpreter.environment.values.append(LoxFunction(self, interpreter.environment))
     
 
     def resolve(self, resolver):
@@ -179,29 +455,101 @@ class Function(Stmt):
         resolver.currentFunction = enclosingFunction
 
 
+    def compile(self, compiler):
+        compiler.declareVariable(self.name)
+        compiler.markInitialized()
+        compiler.function(self, self.kind)
+        compiler.defineVariable(self.name)
+
+
+    def toClosure(self, interpreter):
+        body = self.body.toClosure(interpreter)
+        return lambda environment: environment.values.append(CompiledFunction(self, environment, body))
+
+
+    def transpile(self, transpiler):
+        transpiler.function(transpiler.declare(self.name), self, 'function')
+
+
+    def optimize(self, optimizer):
+        self.body.statements = optimizer.block(self.body.statements)
+        return self
+
+
     def __str__(self):
         return f"<fn {self.name} {self.body}>"
 
 
 class Return(Stmt):
+    __slots__ = ('keyword', 'value', 'tail')
+
     def __init__(self, keyword, value: Expr):
         self.keyword = keyword
         self.value = value
+        self.tail = False
     
 
     def execute(self, interpreter):
-        value = None
-        if self.value != None:
-            value = self.value.evaluate(interpreter)
-        
-        raise ReturnException(value)
+        if self.tail:
+            interpreter.returnValue = self.value.tailCall(interpreter)
+        elif self.value != None:
+            interpreter.returnValue = self.value.evaluate(interpreter)
+        else:
+            interpreter.returnValue = "nil"
+        return RETURN
     
 
     def resolve(self, resolver: Resolver) -> None:
         if resolver.currentFunction == "None":
             print("Can't return from top-level code.")
             exit(1)
-        self.value.resolve(resolver)
+        if self.value != None:
+            self.value.resolve(resolver)
+            # Returning what a call returns is a call in tail position, which
+            # runs without nesting a Python frame per Lox call.
+            self.tail = isinstance(self.value, (CallExpr, InvokeExpr))
+
+
+    def compile(self, compiler):
+        if self.value == None:
+            compiler.emitReturn()
+            return
+        self.value.compile(compiler)
+        compiler.emit(OP_RETURN)
+
+
+    def toClosure(self, interpreter):
+        if self.value == None:
+            def ret(environment):
+                interpreter.returnValue = "nil"
+                return RETURN
+            return ret
+
+        if self.tail:
+            call = self.value.toTailClosure(interpreter)
+            def ret(environment):
+                interpreter.returnValue = call(environment)
+                return RETURN
+            return ret
+
+        value = self.value.toClosure(interpreter)
+        def ret(environment):
+            interpreter.returnValue = value(environment)
+            return RETURN
+        return ret
+
+
+    def transpile(self, transpiler):
+        if self.value == None:
+            transpiler.emit(f"return {transpiler.emptyReturn()}")
+        else:
+            transpiler.emit(f"return {self.value.transpile(transpiler)}")
+
+
+    def optimize(self, optimizer):
+        if self.value != None:
+            self.value = self.value.optimize(optimizer)
+        return self
 
 
     def __str__(self):
@@ -209,6 +557,8 @@ class Return(Stmt):
 
 
 class Class(Stmt):
+    __slots__ = ('name', 'superclass', 'methods')
+
     def __init__(self, name, superclass, methods):
         self.name = name
         self.superclass = superclass
@@ -223,11 +573,12 @@ class Class(Stmt):
                 print("Superclass must be a class.")
                 exit(1)
 
-        interpreter.environment.values[self.name] = None
+        values = interpreter.environment.values
+        slot = len(values)
+        values.append(None)
 
         if self.superclass != None:
-            interpreter.environment = Environment(interpreter.environment)
-            interpreter.environment.values['super'] = superclass
+            interpreter.environment = Environment(interpreter.environment, [superclass])
 
         methods = {}
         for method in self.methods:
@@ -239,7 +590,7 @@ class Class(Stmt):
         if self.superclass != None:
             interpreter.environment = interpreter.environment.enclosing
 
-        interpreter.environment.values[self.name] = klass
+        values[slot] = klass
 
     
     def resolve(self, resolver) -> None:
@@ -255,10 +606,12 @@ class Class(Stmt):
 
         if self.superclass != None:
             resolver.beginScope()
-            resolver.scopes[-1]['super'] = True
+            resolver.declare('super')
+            resolver.define('super')
 
         resolver.beginScope()
-        resolver.scopes[-1]['this'] = True
+        resolver.declare('this')
+        resolver.define('this')
 
         for method in self.methods:
             method.resolve(resolver)
@@ -269,5 +622,87 @@ class Class(Stmt):
         resolver.endScope()
 
     
+    def compile(self, compiler) -> None:
+        compiler.declareVariable(self.name)
+        compiler.emit(OP_CLASS, compiler.constant(self.name))
+        compiler.defineVariable(self.name)
+
+        if self.superclass != None:
+            self.superclass.compile(compiler)
+            compiler.beginScope()
+            compiler.declareVariable('super')
+            compiler.defineVariable('super')
+            compiler.getVariable(self.name)
+            compiler.emit(OP_INHERIT)
+
+        compiler.getVariable(self.name)
+        for method in self.methods:
+            kind = 'initializer' if method.name == 'init' else 'method'
+            compiler.function(method, kind)
+            compiler.emit(OP_METHOD, compiler.constant(method.name))
+        compiler.emit(OP_POP)
+
+        if self.superclass != None:
+            compiler.endScope()
+
+
+    def toClosure(self, interpreter):
+        name = self.name
+        superclassExpr = self.superclass.toClosure(interpreter) if self.superclass != None else None
+        methods = [(method, method.body.toClosure(interpreter)) for method in self.methods]
+
+        def define(environment):
+            superclass = None
+            if superclassExpr != None:
+                superclass = superclassExpr(environment)
+                if not isinstance(superclass, LoxClass):
+                    print("Superclass must be a class.")
+                    exit(1)
+
+            values = environment.values
+            slot = len(values)
+            values.append(None)
+
+            closure = environment
+            if superclass != None:
+                closure = Environment(environment, [superclass])
+
+            functions = {}
+            for method, body in methods:
+                functions[method.name] = CompiledFunction(method, closure, body)
+
+            values[slot] = LoxClass(name, superclass, functions)
+        return define
+
+
+    def transpile(self, transpiler):
+        pyname = transpiler.declare(self.name)
+
+        superclass = 'None'
+        if self.superclass != None:
+            value = self.superclass.transpile(transpiler)
+            transpiler.beginScope()
+            superclass = transpiler.declare('super')
+            transpiler.emit(f"{superclass} = {value}")
+
+        methods = []
+        for method in self.methods:
+            kind = 'initializer' if method.name == 'init' else 'method'
+            function = transpiler.uniqueName(method.name)
+            transpiler.function(function, method, kind)
+            methods.append(f"'{transpiler.attribute(method.name)}': {function}")
+
+        transpiler.emit(f"{pyname} = _makeClass({self.name!r}, {superclass}, {{{', '.join(methods)}}})")
+
+        if self.superclass != None:
+            transpiler.endScope()
+
+
+    def optimize(self, optimizer):
+        for method in self.methods:
+            method.optimize(optimizer)
+        return self
+
+
     def __str__(self):
         return f"(class {self.name})"
\ No newline at end of file
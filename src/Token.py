@@ -18,6 +18,8 @@ TokenType = Enum('TokenType', [
                                ])
 
 class Token:
+    __slots__ = ('type', 'data', 'line')
+
     def __init__(self, type: TokenType, data: any, line: int):
         self.type: TokenType = type
         self.data: any       = data
@@ -0,0 +1,446 @@
+from types import FunctionType, MethodType, CodeType
+from Interpreter import ClockFn
+from Stmt import *
+
+# Runtime support for transpiled programs. Lox classes become real Python
+# classes, Lox functions become plain Python functions and Lox properties
+# become attributes with a 'p_' prefix, so CPython does the dispatch.
+
+def mangle(prefix: str, name: str) -> str:
+    # Lox takes identifiers Python doesn't, like '$a'. Those are spelled in
+    # hex behind an 'x' on the prefix, so no two Lox names collide.
+    if name.isascii() and name.isidentifier():
+        return f"{prefix}_{name}"
+    return f"{prefix}x_{name.encode().hex()}"
+
+
+def unmangle(pyname: str) -> str:
+    prefix, name = pyname.split('_', 1)
+    if prefix.endswith('x'):
+        return bytes.fromhex(name).decode()
+    return name
+
+
+class LoxPyClass(type):
+    # A property of the metaclass, so instances don't see it.
+    @property
+    def arity(cls):
+        return cls.initArity
+
+
+    def __str__(cls):
+        return f"(class {cls.__name__} inherit from {cls.superclass})"
+
+
+class LoxPyObject(metaclass=LoxPyClass):
+    superclass = None
+
+    def __str__(self):
+        return f"instance of {type(self).__name__}"
+
+
+class LoxPyNative:
+    def __init__(self, native):
+        self.native = native
+
+
+    @property
+    def arity(self):
+        return self.native.arity()
+
+
+    def __call__(self, *arguments):
+        return self.native.call(None, list(arguments))
+
+
+    def __str__(self):
+        return str(self.native)
+
+
+def loxPrint(value) -> None:
+    if type(value) is FunctionType:
+        value = f"<fn {unmangle(value.__name__)}>"
+    elif type(value) is MethodType:
+        value = f"<fn {unmangle(value.__func__.__name__)}>"
+    print(value)
+
+
+def getProperty(obj, name: str):
+    if not isinstance(obj, LoxPyObject):
+        print("Only instances have properties.")
+        exit(1)
+    try:
+        return getattr(obj, name)
+    except AttributeError:
+        print(f"Undefined property {unmangle(name)}.")
+        exit(1)
+
+
+def setProperty(obj, name: str, value):
+    if not isinstance(obj, LoxPyObject):
+        print("Only instances have fields.")
+        exit(1)
+    setattr(obj, name, value)
+    return value
+
+
+def assignGlobal(namespace: dict, name: str, value):
+    # Assigning a global the transpiler hasn't seen declared; as on the other
+    # backends, it must have been declared by the time the assignment runs.
+    if name not in namespace:
+        raise NameError(f"Undefined variable '{unmangle(name)}'.")
+    namespace[name] = value
+    return value
+
+
+def callError(callee, argc: int, *arguments):
+    # Reached once a call's check fails, with the arguments evaluated as the
+    # other backends evaluate them before checking. Lox callables all carry
+    # an arity; nothing else does.
+    arity = getattr(callee, 'arity', None)
+    if arity == None:
+        print("Can only call functions and classes.")
+    else:
+        print(f"Expected {arity} arguments but got {argc}.")
+    exit(1)
+
+
+def typeError(operator: str, left, right):
+    print(f"Type error, unsupported operator {operator} for operand types {type(left)} and {type(right)}")
+    exit(1)
+
+
+def makeClass(name: str, superclass, methods: dict) -> LoxPyClass:
+    if superclass == None:
+        base = LoxPyObject
+    elif isinstance(superclass, LoxPyClass):
+        base = superclass
+    else:
+        print("Superclass must be a class.")
+        exit(1)
+
+    namespace = dict(methods)
+    namespace['superclass'] = superclass
+
+    # Calling a class always yields the instance, whatever init returns.
+    initializer = methods.get('p_init')
+    if initializer == None:
+        namespace['initArity'] = 0 if superclass == None else superclass.initArity
+    else:
+        namespace['initArity'] = initializer.arity
+        def __init__(self, *arguments):
+            initializer(self, *arguments)
+        namespace['__init__'] = __init__
+
+    return LoxPyClass(name, (base,), namespace)
+
+
+class PyScope:
+    def __init__(self, enclosing, functionKind: str):
+        self.enclosing = enclosing
+        self.functionKind = functionKind
+        self.lines: list[str] = []
+        self.indent = 0
+        self.loopDepth = 0
+        self.globals: set[str] = set()
+        self.nonlocals: set[str] = set()
+
+
+class Transpiler:
+    cache: dict[str, CodeType] = {}
+
+    def __init__(self):
+        self.scope = PyScope(None, None)
+        # Each Lox scope maps a name to its Python name and the PyScope that
+        # owns it; None marks a Python global.
+        self.scopes: list[dict[str, tuple[str, PyScope]]] = [dict()]
+        self.counter = 0
+
+
+    @staticmethod
+    def namespace() -> dict:
+        return {
+            '_print'      : loxPrint,
+            '_get'        : getProperty,
+            '_set'        : setProperty,
+            '_assignGlobal': assignGlobal,
+            '_callError'  : callError,
+            '_typeError'  : typeError,
+            '_makeClass'  : makeClass,
+            '_MethodType' : MethodType,
+            '_LoxPyClass' : LoxPyClass,
+            'G_clock'     : LoxPyNative(ClockFn()),
+        }
+
+
+    @staticmethod
+    def execute(code: CodeType, namespace: dict = None) -> None:
+        try:
+            exec(code, namespace if namespace != None else Transpiler.namespace())
+        except AttributeError as e:
+            # Properties read straight off an instance, see property().
+            if e.name == None or not e.name.startswith(('p_', 'px_')):
+                print("Runtime error", {e})
+            else:
+                print(f"Undefined property {unmangle(e.name)}.")
+            exit(1)
+        except NameError as e:
+            if e.name != None:
+                e = NameError(f"Undefined variable '{unmangle(e.name)}'.")
+            print("Runtime error", {e})
+            exit(1)
+        except Exception as e:
+            print("Runtime error", {e})
+            exit(1)
+
+
+    def transpile(self, statements) -> str:
+        for statement in statements:
+            statement.transpile(self)
+
+        main = self.scope
+        self.scope = PyScope(None, None)
+        self.emitScope("def _main():", main)
+        self.emit("_main()")
+        return '\n'.join(self.scope.lines) + '\n'
+
+
+    def emit(self, line: str) -> None:
+        self.scope.lines.append('    ' * self.scope.indent + line)
+
+
+    def emitScope(self, header: str, scope: PyScope) -> None:
+        self.emit(header)
+        self.scope.indent += 1
+        if scope.globals:
+            self.emit(f"global {', '.join(sorted(scope.globals))}")
+        if scope.nonlocals:
+            self.emit(f"nonlocal {', '.join(sorted(scope.nonlocals))}")
+        for line in scope.lines:
+            self.emit(line)
+        if not scope.lines:
+            self.emit("pass")
+        self.scope.indent -= 1
+
+
+    def suite(self, statement) -> None:
+        self.scope.indent += 1
+        count = len(self.scope.lines)
+        statement.transpile(self)
+        if len(self.scope.lines) == count:
+            self.emit("pass")
+        self.scope.indent -= 1
+
+
+    def beginScope(self) -> None:
+        self.scopes.append(dict())
+
+
+    def endScope(self) -> None:
+        self.scopes.pop()
+
+
+    def uniqueName(self, name: str) -> str:
+        self.counter += 1
+        return mangle(f"L{self.counter}", name)
+
+
+    def declare(self, name: str) -> str:
+        if len(self.scopes) == 1:
+            pyname = mangle('G', name)
+            self.scopes[0][name] = (pyname, None)
+            self.scope.globals.add(pyname)
+            return pyname
+
+        pyname = self.uniqueName(name)
+        self.scopes[-1][name] = (pyname, self.scope)
+        return pyname
+
+
+    def lookup(self, name: str) -> tuple[str, PyScope]:
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        return (mangle('G', name), None)
+
+
+    def load(self, name: str) -> str:
+        return self.lookup(name)[0]
+
+
+    def declared(self, name: str) -> bool:
+        # Top-level declarations run in order, so a global declared above is
+        # known to exist by the time later code runs.
+        return self.lookup(name)[1] != None or name in self.scopes[0]
+
+
+    def assign(self, name: str, value: str) -> str:
+        if self.declared(name):
+            return f"({self.store(name)} := {value})"
+        return f"_assignGlobal(globals(), '{self.load(name)}', {value})"
+
+
+    def property(self, obj, name: str) -> str:
+        # 'this' is always an instance. Any other object is read from directly
+        # only once its class is known to be a Lox class; _get reports the
+        # rest.
+        code = obj.transpile(self)
+        attribute = self.attribute(name)
+        if isinstance(obj, ThisExpr):
+            return f"{code}.{attribute}"
+        if not isinstance(obj, VarExpr):
+            self.counter += 1
+            code, check = f"_t{self.counter}", f"(_t{self.counter} := {code})"
+        else:
+            check = code
+        return f"({code}.{attribute} if type(type({check})) is _LoxPyClass else _get({code}, '{attribute}'))"
+
+
+    def attribute(self, name: str) -> str:
+        return mangle('p', name)
+
+
+    def call(self, callee: str, arguments: list[str], this: str = None) -> str:
+        # Every Lox callable carries its arity, so one check covers both
+        # errors the other backends report; see callError.
+        if not callee.isidentifier():
+            self.counter += 1
+            callee, check = f"_t{self.counter}", f"(_t{self.counter} := {callee})"
+        else:
+            check = callee
+        passed = arguments if this == None else [this] + arguments
+        argc = len(arguments)
+        return (f"({callee}({', '.join(passed)}) if getattr({check}, 'arity', None) == {argc} "
+                f"else _callError({', '.join([callee, str(argc)] + arguments)}))")
+
+
+    def arithmetic(self, expr, operator: str) -> str:
+        # Python would take booleans too, since they are ints, so operands
+        # are checked as the other backends check them. An operand that isn't
+        # a name or a literal is bound to a temporary in the check, so it is
+        # evaluated once and before the right operand.
+        if self.isNumber(expr.left) and self.isNumber(expr.right):
+            return f"({expr.left.transpile(self)} {operator} {expr.right.transpile(self)})"
+
+        operands = []
+        checks = []
+        for operand in (expr.left, expr.right):
+            code = operand.transpile(self)
+            if isinstance(operand, LiteralExpr) and type(operand.value) is float:
+                operands.append(code)
+                continue
+            if isinstance(operand, (LiteralExpr, VarExpr, ThisExpr)):
+                checks.append(f"(type({code}) is float)")
+            else:
+                self.counter += 1
+                checks.append(f"(type(_t{self.counter} := {code}) is float)")
+                code = f"_t{self.counter}"
+            operands.append(code)
+        left, right = operands
+
+        condition = ' & '.join(checks)
+        if operator == '+' and not (self.isNumber(expr.left) or self.isNumber(expr.right)):
+            condition = f"{condition} or (type({left}) is str) & (type({right}) is str)"
+        return f"({left} {operator} {right} if {condition} else _typeError('{expr.operator.type.name}', {left}, {right}))"
+
+
+    def isNumber(self, expr) -> bool:
+        if isinstance(expr, LiteralExpr):
+            return type(expr.value) is float
+        if isinstance(expr, GroupingExpr):
+            return self.isNumber(expr.expression)
+        if isinstance(expr, (SubtractExpr, MultiplyExpr, DivideExpr)):
+            return True
+        return isinstance(expr, AddExpr) and self.isNumber(expr.left) and self.isNumber(expr.right)
+
+
+    def store(self, name: str) -> str:
+        pyname, owner = self.lookup(name)
+        if owner == None:
+            self.scope.globals.add(pyname)
+        elif owner is not self.scope:
+            self.scope.nonlocals.add(pyname)
+        return pyname
+
+
+    def emptyReturn(self) -> str:
+        if self.scope.functionKind == 'initializer':
+            return self.load('this')
+        return "'nil'"
+
+
+    def function(self, pyname: str, declaration, kind: str) -> None:
+        enclosing = self.scope
+        self.scope = PyScope(enclosing, kind)
+        self.beginScope()
+
+        parameters = []
+        if kind != 'function':
+            parameters.append(self.declare('this'))
+        for parameter in declaration.parameters:
+            parameters.append(self.declare(parameter.data))
+
+        # The body block gets its own Lox scope, as it does in the resolver.
+        statements = declaration.body.statements
+        self.beginScope()
+        for statement in statements:
+            statement.transpile(self)
+        self.endScope()
+        if not statements or not isinstance(statements[-1], Return):
+            self.emit(f"return {self.emptyReturn()}")
+
+        self.endScope()
+        body = self.scope
+        self.scope = enclosing
+        self.emitScope(f"def {pyname}({', '.join(parameters)}):", body)
+        self.emit(f"{pyname}.arity = {len(declaration.parameters)}")
+
+
+    def needsFrame(self, block) -> bool:
+        # Lox gives every loop iteration fresh block variables, while Python
+        # closures share one cell per function. A loop body that declares
+        # variables and may capture them is emitted as its own function.
+        if self.scope.loopDepth == 0:
+            return False
+        if not any(isinstance(statement, (Var, Function, Class)) for statement in block.statements):
+            return False
+        return self.containsFunction(block)
+
+
+    def containsFunction(self, statement) -> bool:
+        if isinstance(statement, (Function, Class)):
+            return True
+        if isinstance(statement, Block):
+            return any(self.containsFunction(inner) for inner in statement.statements)
+        if isinstance(statement, If):
+            return self.containsFunction(statement.ifBranch) or (statement.elseBranch != None and self.containsFunction(statement.elseBranch))
+        if isinstance(statement, While):
+            return self.containsFunction(statement.body)
+        return False
+
+
+    def frame(self, block) -> None:
+        name = f"_frame{self.counter}"
+        self.counter += 1
+
+        enclosing = self.scope
+        self.scope = PyScope(enclosing, enclosing.functionKind)
+        self.beginScope()
+        for statement in block.statements:
+            statement.transpile(self)
+        self.endScope()
+        body = self.scope
+        self.scope = enclosing
+        self.emitScope(f"def {name}():", body)
+
+        if self.scope.functionKind == None:
+            self.emit(f"{name}()")
+            return
+
+        # A Lox return inside the frame hands its value back through the call;
+        # Lox values are never None, so None means the block ran to its end.
+        result = f"_result{self.counter}"
+        self.counter += 1
+        self.emit(f"{result} = {name}()")
+        self.emit(f"if {result} is not None:")
+        self.emit(f"    return {result}")
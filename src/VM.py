@@ -0,0 +1,360 @@
+from Chunk import *
+from LoxCallable import LoxCallable
+from LoxInstance import LoxInstance
+from Interpreter import ClockFn
+
+class VMUpvalue:
+    __slots__ = ('cells', 'index')
+
+    # While open, an upvalue points into the VM stack; closing it moves the
+    # value into a private one-element list, so reads never need a branch.
+    def __init__(self, stack: list, index: int):
+        self.cells = stack
+        self.index = index
+
+
+    def close(self) -> None:
+        self.cells = [self.cells[self.index]]
+        self.index = 0
+
+
+class VMClosure:
+    __slots__ = ('proto', 'upvalues')
+
+    def __init__(self, proto: FunctionProto, upvalues: list[VMUpvalue]):
+        self.proto = proto
+        self.upvalues = upvalues
+
+
+    def __str__(self):
+        return f"<fn {self.proto.name}>"
+
+
+class VMBoundMethod:
+    __slots__ = ('receiver', 'method')
+
+    def __init__(self, receiver, method: VMClosure):
+        self.receiver = receiver
+        self.method = method
+
+
+    def __str__(self):
+        return str(self.method)
+
+
+class VMClass:
+    def __init__(self, name: str):
+        self.name = name
+        self.superclass = None
+        self.methods: dict[str, VMClosure] = {}
+
+
+    def __str__(self):
+        return f"(class {self.name} inherit from {self.superclass})"
+
+
+class VM:
+    def __init__(self):
+        self.stack = []
+        self.frames = []
+        self.openUpvalues: list[VMUpvalue] = []
+        self.globals = {"clock": ClockFn()}
+
+
+    def error(self, message: str) -> None:
+        print(message)
+        exit(1)
+
+
+    def interpret(self, script: FunctionProto) -> None:
+        self.stack.append(VMClosure(script, []))
+        try:
+            self.run()
+        except Exception as e:
+            print("Runtime error", {e})
+            exit(1)
+
+
+    def captureUpvalue(self, index: int) -> VMUpvalue:
+        for upvalue in self.openUpvalues:
+            if upvalue.index == index:
+                return upvalue
+        upvalue = VMUpvalue(self.stack, index)
+        self.openUpvalues.append(upvalue)
+        return upvalue
+
+
+    def closeUpvalues(self, last: int) -> None:
+        remaining = []
+        for upvalue in self.openUpvalues:
+            if upvalue.index >= last:
+                upvalue.close()
+            else:
+                remaining.append(upvalue)
+        self.openUpvalues = remaining
+
+
+    def callValue(self, callee, argc: int):
+        # Returns the closure to enter, or None when the call already completed
+        # (natives) and its result has replaced the callee on the stack.
+        stack = self.stack
+        if type(callee) is VMBoundMethod:
+            stack[-argc - 1] = callee.receiver
+            return callee.method
+
+        if type(callee) is VMClass:
+            instance = LoxInstance(callee)
+            stack[-argc - 1] = instance
+            initializer = callee.methods.get("init")
+            if initializer != None:
+                return initializer
+            if argc != 0:
+                self.error(f"Expected 0 arguments but got {argc}.")
+            return None
+
+        if isinstance(callee, LoxCallable):
+            if argc != callee.arity():
+                self.error(f"Expected {callee.arity()} arguments but got {argc}.")
+            arguments = stack[len(stack) - argc:]
+            del stack[len(stack) - argc - 1:]
+            stack.append(callee.call(self, arguments))
+            return None
+
+        self.error("Can only call functions and classes.")
+
+
+    def bindMethod(self, klass: VMClass, instance, name: str) -> VMBoundMethod:
+        method = klass.methods.get(name)
+        if method == None:
+            self.error(f"Undefined property {name}.")
+        return VMBoundMethod(instance, method)
+
+
+    def run(self) -> None:
+        stack = self.stack
+        push = stack.append
+        pop = stack.pop
+        frames = self.frames
+        globals = self.globals
+
+        closure = stack[-1]
+        proto = closure.proto
+        code = proto.code
+        constants = proto.constants
+        ip = 0
+        bp = 0
+        isConstructor = False
+
+        while True:
+            op = code[ip]
+            arg = code[ip + 1]
+            ip += 2
+
+            if op == OP_GET_LOCAL:
+                push(stack[bp + arg])
+            elif op == OP_CONSTANT:
+                push(constants[arg])
+            elif op == OP_GET_GLOBAL:
+                name = constants[arg]
+                if name not in globals:
+                    self.error(f"Undefined variable '{name}'.")
+                push(globals[name])
+            elif op == OP_JUMP_IF_FALSE:
+                if not stack[-1]:
+                    ip += arg
+            elif op == OP_POP:
+                pop()
+            elif op == OP_LESS:
+                right = pop()
+                stack[-1] = stack[-1] < right
+            elif op == OP_LESS_EQUAL:
+                right = pop()
+                stack[-1] = stack[-1] <= right
+            elif op == OP_GREATER:
+                right = pop()
+                stack[-1] = stack[-1] > right
+            elif op == OP_GREATER_EQUAL:
+                right = pop()
+                stack[-1] = stack[-1] >= right
+            elif op == OP_ADD:
+                right = pop()
+                left = stack[-1]
+                if (type(left) is float and type(right) is float) or (type(left) is str and type(right) is str):
+                    stack[-1] = left + right
+                else:
+                    self.error(f"Type error, unsupported operator PLUS for operand types {type(left)} and {type(right)}")
+            elif op == OP_SUBTRACT:
+                right = pop()
+                left = stack[-1]
+                if type(left) is float and type(right) is float:
+                    stack[-1] = left - right
+                else:
+                    self.error(f"Type error, unsupported operator MINUS for operand types {type(left)} and {type(right)}")
+            elif op == OP_MULTIPLY:
+                right = pop()
+                left = stack[-1]
+                if type(left) is float and type(right) is float:
+                    stack[-1] = left * right
+                else:
+                    self.error(f"Type error, unsupported operator STAR for operand types {type(left)} and {type(right)}")
+            elif op == OP_DIVIDE:
+                right = pop()
+                left = stack[-1]
+                if type(left) is float and type(right) is float:
+                    stack[-1] = left / right
+                else:
+                    self.error(f"Type error, unsupported operator SLASH for operand types {type(left)} and {type(right)}")
+            elif op == OP_MODULO:
+                right = pop()
+                stack[-1] = stack[-1] % right
+            elif op == OP_EQUAL:
+                right = pop()
+                stack[-1] = stack[-1] == right
+            elif op == OP_NOT_EQUAL:
+                right = pop()
+                stack[-1] = stack[-1] != right
+            elif op == OP_SET_LOCAL:
+                stack[bp + arg] = stack[-1]
+            elif op == OP_JUMP:
+                ip += arg
+            elif op == OP_LOOP:
+                ip -= arg
+            elif op == OP_CALL:
+                callee = stack[-arg - 1]
+                constructing = False
+                if type(callee) is not VMClosure:
+                    constructing = type(callee) is VMClass
+                    callee = self.callValue(callee, arg)
+                    if callee == None:
+                        continue
+                if arg != callee.proto.arity:
+                    self.error(f"Expected {callee.proto.arity} arguments but got {arg}.")
+                frames.append((closure, ip, bp, isConstructor))
+                closure = callee
+                proto = closure.proto
+                code = proto.code
+                constants = proto.constants
+                ip = 0
+                bp = len(stack) - arg - 1
+                isConstructor = constructing
+            elif op == OP_INVOKE:
+                argc = arg & 0xff
+                name = constants[arg >> 8]
+                receiver = stack[-argc - 1]
+                if type(receiver) is not LoxInstance:
+                    self.error("Only instances have properties.")
+                constructing = False
+                index = receiver.shape.slots.get(name)
+                if index != None:
+                    callee = receiver.values[index]
+                    stack[-argc - 1] = callee
+                    if type(callee) is not VMClosure:
+                        constructing = type(callee) is VMClass
+                        callee = self.callValue(callee, argc)
+                        if callee == None:
+                            continue
+                else:
+                    callee = receiver.klass.methods.get(name)
+                    if callee == None:
+                        self.error(f"Undefined property {name}.")
+                if argc != callee.proto.arity:
+                    self.error(f"Expected {callee.proto.arity} arguments but got {argc}.")
+                frames.append((closure, ip, bp, isConstructor))
+                closure = callee
+                proto = closure.proto
+                code = proto.code
+                constants = proto.constants
+                ip = 0
+                bp = len(stack) - argc - 1
+                isConstructor = constructing
+            elif op == OP_RETURN:
+                result = pop()
+                if self.openUpvalues:
+                    self.closeUpvalues(bp)
+                if isConstructor:
+                    result = stack[bp]
+                del stack[bp:]
+                if not frames:
+                    return
+                closure, ip, bp, isConstructor = frames.pop()
+                proto = closure.proto
+                code = proto.code
+                constants = proto.constants
+                push(result)
+            elif op == OP_GET_UPVALUE:
+                upvalue = closure.upvalues[arg]
+                push(upvalue.cells[upvalue.index])
+            elif op == OP_SET_UPVALUE:
+                upvalue = closure.upvalues[arg]
+                upvalue.cells[upvalue.index] = stack[-1]
+            elif op == OP_GET_PROPERTY:
+                instance = stack[-1]
+                if type(instance) is not LoxInstance:
+                    self.error("Only instances have properties.")
+                name = constants[arg]
+                index = instance.shape.slots.get(name)
+                if index != None:
+                    stack[-1] = instance.values[index]
+                else:
+                    stack[-1] = self.bindMethod(instance.klass, instance, name)
+            elif op == OP_SET_PROPERTY:
+                value = pop()
+                instance = stack[-1]
+                if type(instance) is not LoxInstance:
+                    self.error("Only instances have fields.")
+                name = constants[arg]
+                index = instance.shape.slots.get(name)
+                if index != None:
+                    instance.values[index] = value
+                else:
+                    instance.shape = instance.shape.withField(name)
+                    instance.values.append(value)
+                stack[-1] = value
+            elif op == OP_SET_GLOBAL:
+                name = constants[arg]
+                if name not in globals:
+                    self.error(f"Undefined variable '{name}'.")
+                globals[name] = stack[-1]
+            elif op == OP_DEFINE_GLOBAL:
+                globals[constants[arg]] = pop()
+            elif op == OP_NOT:
+                stack[-1] = not stack[-1]
+            elif op == OP_NEGATE:
+                stack[-1] = -stack[-1]
+            elif op == OP_PRINT:
+                print(pop())
+            elif op == OP_POPN:
+                del stack[-arg:]
+            elif op == OP_NIL:
+                push("nil")
+            elif op == OP_TRUE:
+                push(True)
+            elif op == OP_FALSE:
+                push(False)
+            elif op == OP_CLOSURE:
+                function = constants[arg]
+                upvalues = []
+                for isLocal, index in function.upvalues:
+                    if isLocal:
+                        upvalues.append(self.captureUpvalue(bp + index))
+                    else:
+                        upvalues.append(closure.upvalues[index])
+                push(VMClosure(function, upvalues))
+            elif op == OP_CLOSE_UPVALUE:
+                self.closeUpvalues(len(stack) - 1)
+                pop()
+            elif op == OP_GET_SUPER:
+                superclass = pop()
+                stack[-1] = self.bindMethod(superclass, stack[-1], constants[arg])
+            elif op == OP_CLASS:
+                push(VMClass(constants[arg]))
+            elif op == OP_INHERIT:
+                superclass = stack[-2]
+                if type(superclass) is not VMClass:
+                    self.error("Superclass must be a class.")
+                subclass = pop()
+                subclass.superclass = superclass
+                subclass.methods.update(superclass.methods)
+            elif op == OP_METHOD:
+                method = pop()
+                stack[-1].methods[constants[arg]] = method
@@ -0,0 +1,53 @@
+import io
+import os
+import sys
+import unittest
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from Lox import Lox
+from Profiler import Profiler
+
+SOURCE = """
+fun work(n) { var s = 0; for (var i = 0; i < n; i = i + 1) s = s + i; return s; }
+fun wrapper(n) { return work(n); }
+fun even(n) { if (n == 0) return true; return odd(n - 1); }
+fun odd(n) { if (n == 0) return false; return even(n - 1); }
+class Walker { go(n) { return this.step(n); } step(n) { return work(n); } }
+print wrapper(20000);
+print even(11);
+print Walker().go(10);
+"""
+
+
+def profile(backend: str) -> dict:
+    profiler = Profiler()
+    with contextlib.redirect_stdout(io.StringIO()):
+        Lox(backend, profiler=profiler).run(SOURCE)
+    return {result['name']: result for result in profiler.results()}
+
+
+class TailCallProfileTest(unittest.TestCase):
+    def check(self, backend: str) -> None:
+        results = profile(backend)
+        self.assertEqual(results['wrapper']['calls'], 1)
+        self.assertEqual(results['work']['calls'], 2)
+        self.assertEqual(results['even']['calls'], 6)
+        self.assertEqual(results['odd']['calls'], 6)
+        self.assertEqual(results['Walker.go']['calls'], 1)
+        self.assertEqual(results['Walker.step']['calls'], 1)
+        # The loop runs in work, not in the function that tail-called it.
+        self.assertGreater(results['work']['exclusive'], results['wrapper']['exclusive'])
+
+
+    def testTree(self):
+        self.check('tree')
+
+
+    def testClosure(self):
+        self.check('closure')
+
+
+if __name__ == '__main__':
+    unittest.main()